@@ -0,0 +1,219 @@
+"""
+Benchmark of the conversion pipeline on synthetic models.
+Every stage is timed on its own (best of --repeat runs) and run once more under tracemalloc
+for its peak memory. Results are written as JSON and can be compared with an earlier run.
+
+Usage (from the src directory):
+    python -m benchmark --kind grid tower --size 20 -o results.json
+    python -m benchmark --compare baseline.json results.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+import pipeline
+import synthetic
+
+STAGES = ("parse", "assign_views", "geometry", "views", "export")
+OPTIONS = {"Dim": "All", "YZ": True, "XZ": True, "XY": True, "Cyl": 16, "Prec": 3, "Subs": False, "Format": "obj"}
+
+def _folder_size(folder: str) -> int:
+    return sum(entry.stat().st_size for entry in os.scandir(folder) if entry.is_file())
+
+def _export(views, name, options, dest) -> None:
+    pipeline.export_views(views, name, {**options, "Dest": dest})
+
+def run_stages(filepath: str, options, dest: str) -> dict:
+    """
+    Run the pipeline stages of convert_file one after the other on a file.
+
+    Returns
+    -------
+    dict
+        Wall time in seconds per stage, plus the member, vertex, face and byte counts.
+    """
+    times = {}
+    start = time.perf_counter()
+    model = pipeline.parse_model(filepath)
+    times["parse"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    masks = model.assign_views()
+    times["assign_views"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    geometry = pipeline.build_geometry(model, options)
+    times["geometry"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    name = os.path.splitext(os.path.basename(filepath))[0]
+    views = [pipeline.gen_view(model.members, model.nodes, name, view, options, geometry, masks)
+             for view in pipeline.selected_views(options)]
+    times["views"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    _export(views, name, options, dest)
+    times["export"] = time.perf_counter() - start
+
+    generated = [view for view in views if len(view) > 2]
+    return {"seconds": times, "members": len(model), "nodes": len(model.nodes),
+            "vertices": sum(len(view[0]) for view in generated),
+            "faces": sum(len(block) for view in generated for block in view[1]),
+            "bytes_written": _folder_size(dest)}
+
+def peak_memory(filepath: str, options, dest: str) -> dict:
+    """
+    Peak traced memory of each stage in bytes, the stages run once under tracemalloc.
+    """
+    peaks = {}
+    tracemalloc.start()
+    try:
+        def measure(stage, function, *args):
+            tracemalloc.reset_peak()
+            result = function(*args)
+            peaks[stage] = tracemalloc.get_traced_memory()[1]
+            return result
+        model = measure("parse", pipeline.parse_model, filepath)
+        masks = measure("assign_views", model.assign_views)
+        geometry = measure("geometry", pipeline.build_geometry, model, options)
+        name = os.path.splitext(os.path.basename(filepath))[0]
+        views = measure("views", lambda: [pipeline.gen_view(model.members, model.nodes, name, view, options, geometry, masks)
+                                          for view in pipeline.selected_views(options)])
+        measure("export", _export, views, name, options, dest)
+    finally:
+        tracemalloc.stop()
+    return peaks
+
+def benchmark_file(filepath: str, options, repeat: int = 3, memory: bool = True) -> dict:
+    """
+    Benchmark the conversion of one file.
+
+    Parameters
+    ----------
+    filepath : str
+        The .r3d or .3dd file.
+    options : dict
+        The conversion options, "Dest" is replaced by a temporary folder.
+    repeat : int, optional
+        The number of timed runs, the fastest time of each stage is kept.
+    memory : bool, optional
+        Also measure the peak memory of each stage.
+
+    Returns
+    -------
+    dict
+        Per stage wall time, throughput and peak memory, and the model and output sizes.
+    """
+    runs = []
+    dest = tempfile.mkdtemp(prefix="benchmark_")
+    try:
+        for _ in range(max(repeat, 1)):
+            runs.append(run_stages(filepath, options, dest))
+        peaks = peak_memory(filepath, options, dest) if memory else {}
+    finally:
+        shutil.rmtree(dest, ignore_errors=True)
+
+    result = {key: value for key, value in runs[0].items() if key != "seconds"}
+    result["file"] = os.path.basename(filepath)
+    result["file_bytes"] = os.path.getsize(filepath)
+    stages = {}
+    for stage in STAGES:
+        seconds = min(run["seconds"][stage] for run in runs)
+        stages[stage] = {"seconds": seconds, "members_per_s": result["members"] / seconds if seconds else None}
+        if stage in peaks:
+            stages[stage]["peak_bytes"] = peaks[stage]
+    stages["parse"]["mb_per_s"] = result["file_bytes"] / 2**20 / stages["parse"]["seconds"]
+    stages["export"]["mb_per_s"] = result["bytes_written"] / 2**20 / stages["export"]["seconds"]
+    result["stages"] = stages
+    result["total_seconds"] = sum(stage["seconds"] for stage in stages.values())
+    return result
+
+def run(kinds: list[str], size: int, extensions: list[str], options, repeat: int = 3, memory: bool = True) -> dict:
+    """
+    Generate the synthetic models and benchmark each of them.
+
+    Returns
+    -------
+    dict
+        The environment and one result per model file, see benchmark_file.
+    """
+    results = {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+               "numpy": np.__version__, "platform": platform.platform(), "size": size,
+               "options": options, "results": []}
+    folder = tempfile.mkdtemp(prefix="synthetic_")
+    try:
+        for kind in kinds:
+            model = synthetic.GENERATORS[kind](size)
+            for extension in extensions:
+                path = os.path.join(folder, f"{kind}{size}{extension}")
+                synthetic.WRITERS[extension](path, model)
+                result = benchmark_file(path, options, repeat, memory)
+                result["kind"] = kind
+                results["results"].append(result)
+                print(summary_line(result))
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+    return results
+
+def summary_line(result: dict) -> str:
+    stages = "  ".join(f"{stage} {values['seconds']:.3f}s" for stage, values in result["stages"].items())
+    return (f"{result['file']:<16} {result['members']:>8} members  {stages}  "
+            f"total {result['total_seconds']:.3f}s  export {result['stages']['export']['mb_per_s']:.1f} MB/s")
+
+def compare(baseline: dict, current: dict) -> list[str]:
+    """
+    Stage time ratios of two result files, current over baseline, matched by file name.
+
+    Returns
+    -------
+    list[str]
+        One line per file present in both.
+    """
+    previous = {result["file"]: result for result in baseline["results"]}
+    lines = []
+    for result in current["results"]:
+        old = previous.get(result["file"])
+        if old is None:
+            continue
+        ratios = "  ".join(f"{stage} x{values['seconds'] / old['stages'][stage]['seconds']:.2f}"
+                           for stage, values in result["stages"].items()
+                           if stage in old["stages"] and old["stages"][stage]["seconds"])
+        lines.append(f"{result['file']:<16} {ratios}  total x{result['total_seconds'] / old['total_seconds']:.2f}")
+    return lines
+
+def main(argv: list[str] = None) -> None:
+    parser = argparse.ArgumentParser(prog="benchmark", description="Benchmark the conversion pipeline on synthetic models.")
+    parser.add_argument("--kind", nargs="+", choices=sorted(synthetic.GENERATORS), default=["grid", "tower", "truss"],
+                        help="Model topologies to generate. Default is all of them.")
+    parser.add_argument("--size", type=int, default=12, help="Model size, see synthetic.py. Default is 12.")
+    parser.add_argument("--formats", nargs="+", choices=sorted(synthetic.WRITERS), default=sorted(synthetic.WRITERS),
+                        help="Input formats to benchmark. Default is both.")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per model, the fastest is kept. Default is 3.")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the peak memory measurement.")
+    parser.add_argument("--cyl", type=int, default=OPTIONS["Cyl"], help="Number of cylinder sides. Default is 16.")
+    parser.add_argument("-o", "--output", default=None, help="Write the results to this JSON file.")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"), help="Compare two result files and exit.")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0]) as baseline, open(args.compare[1]) as current:
+            print("\n".join(compare(json.load(baseline), json.load(current))))
+        return
+
+    # Views without members are expected on some topologies, only the summary is printed.
+    logging.disable(logging.ERROR)
+    results = run(args.kind, args.size, args.formats, {**OPTIONS, "Cyl": args.cyl}, args.repeat, not args.no_memory)
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=1)
+
+if __name__ == "__main__":
+    main()
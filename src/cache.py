@@ -0,0 +1,140 @@
+"""
+Opt-in on-disk cache of parsed models, so unchanged files are not parsed again.
+Entries are .npz files named after the content hash of the source file and the parser version.
+"""
+import hashlib
+import logging
+import os
+import tempfile
+from typing import Union
+
+import numpy as np
+
+from model import Model
+
+# Bump when a parser change alters the parsed model, old entries are then never hit again.
+PARSER_VERSION = 1
+CACHE_SIZE = 512 * 1024 * 1024
+HASH_CHUNK = 1 << 20
+
+def file_key(filepath: str) -> str:
+    """
+    The cache key of a file: a hash of its contents, extension and the parser version.
+
+    Parameters
+    ----------
+    filepath : str
+        The path of the .r3d or .3dd file.
+
+    Returns
+    -------
+    str
+        The hex digest.
+    """
+    digest = hashlib.sha256(f"{PARSER_VERSION}{os.path.splitext(filepath)[1].lower()}".encode())
+    with open(filepath, 'rb') as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def entry_path(cache_dir: str, key: str) -> str:
+    return os.path.join(cache_dir, key + ".npz")
+
+def load(cache_dir: str, key: str) -> Union[Model, None]:
+    """
+    Load a cached model and mark it as recently used.
+
+    Returns
+    -------
+    Model or None
+        The model, or None if there is no usable entry.
+    """
+    path = entry_path(cache_dir, key)
+    try:
+        with np.load(path, allow_pickle=False) as arrays:
+            model = Model.from_arrays(arrays)
+        os.utime(path)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logging.error(f"Discarding unreadable cache entry {path}: {e!r}")
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return None
+    return model
+
+def store(cache_dir: str, key: str, model: Model, max_size: int = CACHE_SIZE) -> None:
+    """
+    Store a model, then evict the least recently used entries above max_size bytes.
+    The entry is written to a temporary file first so concurrent readers never see half of it.
+    """
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        handle, temp_path = tempfile.mkstemp(suffix=".tmp", dir=cache_dir)
+        try:
+            with os.fdopen(handle, 'wb') as file:
+                np.savez(file, **model.to_arrays())
+            os.replace(temp_path, entry_path(cache_dir, key))
+        except BaseException:
+            # Leave no half written entry behind, it would never be read or evicted.
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+    except OSError as e:
+        logging.error(f"Could not write to the parse cache {cache_dir}: {e}")
+        return
+    evict(cache_dir, max_size)
+
+def evict(cache_dir: str, max_size: int = CACHE_SIZE) -> None:
+    """
+    Remove the least recently used entries until the cache fits in max_size bytes.
+    """
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if entry.is_file() and entry.name.endswith(".npz"):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_size:
+            break
+        try:
+            os.remove(path)
+            total -= size
+            logging.debug(f"Evicted {path} from the parse cache")
+        except OSError:
+            pass
+
+def cached_model(filepath: str, parse, cache_dir: str, max_size: int = CACHE_SIZE) -> Union[Model, None]:
+    """
+    Return the cached model of a file, parsing and storing it on a miss.
+
+    Parameters
+    ----------
+    filepath : str
+        The path of the .r3d or .3dd file.
+    parse : callable
+        Parses the file into a Model, or returns None on failure.
+    cache_dir : str
+        The cache directory, created when needed.
+    max_size : int, optional
+        The size limit of the cache in bytes, 512 MB by default.
+
+    Returns
+    -------
+    Model or None
+        The model, or None if the file could not be parsed.
+    """
+    key = file_key(filepath)
+    model = load(cache_dir, key)
+    if model is not None:
+        logging.info(f"Loaded {filepath} from the parse cache")
+        return model
+    model = parse(filepath)
+    if model is not None:
+        store(cache_dir, key, model, max_size)
+    return model
@@ -0,0 +1,146 @@
+"""
+Command-line entry point for converting RISA-3D and Modelsmart files without the GUI.
+
+Usage (from the src directory):
+    python -m cli model.r3d "project/*.3dd" -d out --views All --cyl 16 --prec 3 -j 8
+"""
+import argparse
+import glob
+import logging
+import os
+import sys
+
+import exporters as exp
+import pipeline
+import profiling
+import sections
+import watch
+
+PROFILE_NAME = "convert_profile"
+
+
+def expand_inputs(patterns: list[str]) -> list[str]:
+    """
+    Expand the file arguments, which may be plain paths or glob patterns.
+    Patterns that match nothing are kept so the missing file gets reported.
+
+    Parameters
+    ----------
+    patterns : list[str]
+        The file arguments.
+
+    Returns
+    -------
+    list[str]
+        The file paths, without duplicates, in argument order.
+    """
+    files = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern, recursive=True)) if glob.has_magic(pattern) else [pattern]
+        for match in matches or [pattern]:
+            if match not in files:
+                files.append(match)
+    return files
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="cli", description="Convert RISA-3D (.r3d) and Modelsmart (.3dd) files to OBJ, STL or GLB.")
+    parser.add_argument("files", nargs="+", help="Input files or glob patterns, or the folders to watch with --watch.")
+    parser.add_argument("-d", "--dest", default=os.getcwd(), help="Destination folder. Default is the current directory.")
+    parser.add_argument("--views", choices=("2D", "3D", "All", "None"), default="All",
+                        help="Views to generate, None for only the --section views. Default is All.")
+    parser.add_argument("--planes", nargs="+", choices=("YZ", "XZ", "XY"), default=["YZ", "XZ", "XY"],
+                        help="2D projections to generate. Default is all of them.")
+    parser.add_argument("--section", action="append", default=[], metavar="SPEC",
+                        help="Add a view of the members on a plane, e.g. z=240, level_2:z=240~0.5 (within 0.5), "
+                             "or in a slab, e.g. storey_2:z=240..480, z=240..480+ (also members crossing it). Repeatable.")
+    parser.add_argument("--sections-file", default=None,
+                        help="Add the section views listed in this JSON file, see sections.py.")
+    parser.add_argument("--cyl", type=int, default=16, help="Number of side faces for generated cylinders. Default is 16.")
+    parser.add_argument("--cyl-tol", type=float, default=None,
+                        help="Pick the sides of each cylinder from its radius, keeping the facet error under this fraction "
+                             "of the model size (e.g. 0.0001). Overrides --cyl.")
+    parser.add_argument("--cyl-min", type=int, default=None, help="Fewest sides of an adaptive cylinder. Default is 6.")
+    parser.add_argument("--cyl-max", type=int, default=None, help="Most sides of an adaptive cylinder. Default is 64.")
+    parser.add_argument("--prec", type=int, default=3, help="Number of decimal places to round to. Default is 3.")
+    parser.add_argument("--format", choices=sorted(exp.EXPORTERS), default="obj",
+                        help="Output file format: ASCII OBJ, binary STL or binary glTF (GLB). Default is obj.")
+    parser.add_argument("--weld", action="store_true", help="Merge duplicate vertices after rounding for smaller files.")
+    parser.add_argument("--chunk-size", type=int, default=None,
+                        help="Generate and write the views this many members at a time, bounding memory on huge models. "
+                             "Off by default, ignored with --weld.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only rewrite the views whose members or options changed since the last run.")
+    parser.add_argument("--cache-dir", default=None,
+                        help="Keep parsed models in this folder so unchanged files are not parsed again. Off by default.")
+    parser.add_argument("--cache-size", type=int, default=512, help="Size limit of the parse cache in MB. Default is 512.")
+    parser.add_argument("-j", "--workers", type=int, default=None,
+                        help="Number of files converted in parallel. Default is one per CPU.")
+    parser.add_argument("--export-threads", type=int, default=None,
+                        help="Number of views of a file written at the same time. Default is 4.")
+    parser.add_argument("--no-subfolders", action="store_true", help="Write the OBJ files directly into the destination folder.")
+    parser.add_argument("--metrics", default=None,
+                        help="Append per-stage and per-view timing, size and memory records to this JSON-lines file.")
+    parser.add_argument("--metrics-memory", action="store_true",
+                        help="Also record the peak traced memory of each stage. Slows the conversion down.")
+    parser.add_argument("--profile", action="store_true",
+                        help="Run the conversion under cProfile in this process and write convert_profile.prof and "
+                             "a summary of the slowest functions, convert_profile.txt, to the destination folder.")
+    parser.add_argument("--profile-top", type=int, default=30, help="Functions listed in the profile summary. Default is 30.")
+    parser.add_argument("--count-calls", action="store_true", help="Log the calls and time of every pipeline function per file.")
+    parser.add_argument("--check-winding", action="store_true",
+                        help="Check that the faces of every member are wound outwards and log those that are not. "
+                             "Slows the conversion down, ignored with --chunk-size.")
+    parser.add_argument("--watch", action="store_true",
+                        help="Keep running and convert every .r3d and .3dd file under the given folders when it is "
+                             "added or modified. Only files changed since their last conversion are converted.")
+    parser.add_argument("--interval", type=float, default=watch.INTERVAL, help="Seconds between scans with --watch. Default is 2.")
+    parser.add_argument("--settle", type=float, default=watch.SETTLE,
+                        help="Seconds a file must stay unchanged before it is converted with --watch. Default is 2.")
+    parser.add_argument("--log-file", default=None, help="Write the log to this file instead of the console.")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Log debug messages.")
+    return parser
+
+
+def options_from_args(args: argparse.Namespace) -> dict:
+    """
+    Build the options dict used by the pipeline, in the same shape as the GUI's.
+    """
+    return {"Dest": args.dest, "Dim": args.views, "Sections": args.sections,
+            "YZ": "YZ" in args.planes, "XZ": "XZ" in args.planes, "XY": "XY" in args.planes,
+            "Cyl": args.cyl, "Prec": args.prec, "Subs": not args.no_subfolders, "Format": args.format,
+            "CylTol": args.cyl_tol, "CylMin": args.cyl_min, "CylMax": args.cyl_max,
+            "Weld": args.weld, "Cache": args.cache_dir, "CacheSize": args.cache_size * 1024 * 1024,
+            "Incremental": args.incremental, "Metrics": args.metrics,
+            "MetricsMemory": args.metrics_memory, "CountCalls": args.count_calls,
+            "Chunk": args.chunk_size, "ExportThreads": args.export_threads, "CheckWinding": args.check_winding}
+
+
+def main(argv: list[str] = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    try:
+        args.sections = (sections.load_sections(args.sections_file) if args.sections_file else []) + args.section
+        sections.parse_sections(args.sections)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    pipeline.setup_logging(args.log_file, logging.DEBUG if args.verbose else logging.INFO)
+
+    options = options_from_args(args)
+    os.makedirs(args.dest, exist_ok=True)
+    if args.watch:
+        watch.Watcher(expand_inputs(args.files), options, args.workers, args.interval, args.settle).run()
+        return 0
+    if args.profile:
+        # cProfile only sees this process and thread, so the files and views are converted here one after the other.
+        results = profiling.profile_call(os.path.join(args.dest, PROFILE_NAME), args.profile_top, pipeline.convert_files,
+                                         expand_inputs(args.files), {**options, "ExportThreads": 1}, 1)
+    else:
+        results = pipeline.convert_files(expand_inputs(args.files), options, args.workers)
+    for filepath, converted in results.items():
+        print(f"{'OK    ' if converted else 'FAILED'} {filepath}", file=sys.stdout if converted else sys.stderr)
+    return 0 if all(results.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,398 @@
+import json
+import os
+import shutil
+import tempfile
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+import profiling
+
+# Rows formatted per % operation, bounds the size of the temporary argument tuple.
+CHUNK_ROWS = 65536
+
+def format_rows(prefix: str, value_format: str, rows: np.ndarray) -> str:
+    """
+    Format a 2D array as OBJ statements, one per row.
+    Each chunk of rows is formatted by a single % operation on a repeated line template.
+
+    Parameters
+    ----------
+    prefix : str
+        The OBJ statement, 'v' or 'f'.
+    value_format : str
+        The printf style format of a single value.
+    rows : np.ndarray
+        The values, one statement per row.
+
+    Returns
+    -------
+    str
+        The formatted lines.
+    """
+    if rows.shape[0] == 0:
+        return ""
+    line = prefix + " " + " ".join([value_format] * rows.shape[1]) + "\n"
+    parts = []
+    for start in range(0, rows.shape[0], CHUNK_ROWS):
+        chunk = rows[start:start + CHUNK_ROWS]
+        parts.append((line * chunk.shape[0]) % tuple(chunk.ravel().tolist()))
+    return "".join(parts)
+
+@profiling.counted
+def format_obj(vertices: np.ndarray, faces: list[np.ndarray], decimals: int) -> str:
+    """
+    Build the text of an OBJ file.
+
+    Parameters
+    ----------
+    vertices : np.ndarray
+        (V,3) vertex coordinates.
+    faces : list[np.ndarray]
+        Face blocks of 1-based vertex indices, one 2D array per face arity.
+    decimals : int
+        Number of decimal places written for the coordinates.
+
+    Returns
+    -------
+    str
+        The OBJ text.
+    """
+    # Adding zero turns -0.0 into 0.0 so no "-0.000" coordinates are written.
+    text = [format_rows("v", f"%.{max(decimals, 0)}f", np.asarray(vertices, dtype=float) + 0.0)]
+    for block in faces:
+        text.append(format_rows("f", "%d", np.asarray(block)))
+    return "".join(text)
+
+@profiling.counted
+def write_obj(path: str, vertices: np.ndarray, faces: list[np.ndarray], decimals: int) -> int:
+    """
+    Write a mesh to an OBJ file with a single buffered write.
+
+    Returns
+    -------
+    int
+        The number of characters written.
+    """
+    text = format_obj(vertices, faces, decimals)
+    with open(path, "w") as obj_file:
+        return obj_file.write(text)
+
+def triangulate(faces: list[np.ndarray]) -> np.ndarray:
+    """
+    Split every face into a fan of triangles.
+
+    Parameters
+    ----------
+    faces : list[np.ndarray]
+        Face blocks of 1-based vertex indices, one 2D array per face arity.
+
+    Returns
+    -------
+    np.ndarray
+        (T,3) 0-based vertex indices.
+    """
+    triangles = [np.empty((0, 3), dtype=np.int64)]
+    for block in faces:
+        block = np.asarray(block, dtype=np.int64) - 1
+        # Face [a, b, c, d, ...] becomes [a, b, c], [a, c, d], ...
+        for k in range(1, block.shape[1] - 1):
+            triangles.append(block[:, [0, k, k + 1]])
+    return np.concatenate(triangles)
+
+STL_RECORD = np.dtype([("normal", "<f4", (3,)), ("vertices", "<f4", (3, 3)), ("attribute", "<u2")])
+
+def stl_records(vertices: np.ndarray, faces: list[np.ndarray]) -> np.ndarray:
+    """
+    The binary STL records of a mesh, one per triangle. Quad faces are split into two triangles.
+    """
+    triangles = np.asarray(vertices, dtype=float)[triangulate(faces)]
+    normals = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    lengths = np.linalg.norm(normals, axis=1)
+    # Degenerate triangles get a zero normal instead of a division by zero.
+    normals = np.divide(normals, lengths[:, None], out=np.zeros_like(normals), where=lengths[:, None] > 0)
+
+    records = np.zeros(triangles.shape[0], dtype=STL_RECORD)
+    records["normal"] = normals
+    records["vertices"] = triangles
+    return records
+
+def stl_header(triangle_count: int) -> bytes:
+    return b"Binary STL".ljust(80, b" ") + np.uint32(triangle_count).tobytes()
+
+@profiling.counted
+def write_stl(path: str, vertices: np.ndarray, faces: list[np.ndarray], decimals: int) -> int:
+    """
+    Write a mesh to a binary STL file. Quad faces are split into two triangles.
+
+    Returns
+    -------
+    int
+        The number of bytes written.
+    """
+    records = stl_records(vertices, faces)
+    with open(path, "wb") as stl_file:
+        return stl_file.write(stl_header(records.shape[0]) + records.tobytes())
+
+GLB_MAGIC = 0x46546C67  # "glTF"
+GLB_JSON_CHUNK = 0x4E4F534A  # "JSON"
+GLB_BIN_CHUNK = 0x004E4942  # "BIN\0"
+
+def _pad(data: bytes, fill: bytes) -> bytes:
+    return data + fill * (-len(data) % 4)
+
+def glb_header(name: str, position_bytes: int, index_bytes: int, vertex_count: int, index_count: int,
+               minimum: list[float], maximum: list[float]) -> bytes:
+    """
+    Everything of a GLB file before its position data: the file header, the JSON chunk
+    describing one mesh and the header of the binary chunk.
+
+    Parameters
+    ----------
+    name : str
+        The mesh name.
+    position_bytes, index_bytes : int
+        The unpadded sizes of the float32 positions and uint32 indices.
+    vertex_count, index_count : int
+        The number of positions and indices.
+    minimum, maximum : list[float]
+        The bounds of the positions.
+
+    Returns
+    -------
+    bytes
+        The header, to be followed by the padded positions and the padded indices.
+    """
+    padded_positions = position_bytes + -position_bytes % 4
+    binary_length = padded_positions + index_bytes + -index_bytes % 4
+    gltf = {
+        "asset": {"version": "2.0", "generator": "Structural 3D File Converter"},
+        "scene": 0,
+        "scenes": [{"nodes": [0]}],
+        "nodes": [{"mesh": 0, "name": name}],
+        "meshes": [{"name": name, "primitives": [{"attributes": {"POSITION": 0}, "indices": 1, "mode": 4}]}],
+        "buffers": [{"byteLength": binary_length}],
+        "bufferViews": [
+            {"buffer": 0, "byteOffset": 0, "byteLength": position_bytes, "target": 34962},
+            {"buffer": 0, "byteOffset": padded_positions, "byteLength": index_bytes, "target": 34963},
+        ],
+        "accessors": [
+            {"bufferView": 0, "componentType": 5126, "count": vertex_count, "type": "VEC3",
+             "min": minimum, "max": maximum},
+            {"bufferView": 1, "componentType": 5125, "count": index_count, "type": "SCALAR"},
+        ],
+    }
+    json_chunk = _pad(json.dumps(gltf, separators=(",", ":")).encode("utf-8"), b" ")
+
+    length = 12 + 8 + len(json_chunk) + 8 + binary_length
+    return (np.array([GLB_MAGIC, 2, length, len(json_chunk), GLB_JSON_CHUNK], dtype="<u4").tobytes() + json_chunk
+            + np.array([binary_length, GLB_BIN_CHUNK], dtype="<u4").tobytes())
+
+@profiling.counted
+def write_glb(path: str, vertices: np.ndarray, faces: list[np.ndarray], decimals: int) -> int:
+    """
+    Write a mesh to a binary glTF (GLB) file with packed float32 positions and uint32 triangle indices.
+
+    Returns
+    -------
+    int
+        The number of bytes written.
+    """
+    positions = np.ascontiguousarray(vertices, dtype="<f4")
+    indices = np.ascontiguousarray(triangulate(faces), dtype="<u4")
+    position_bytes = positions.tobytes()
+    index_bytes = indices.tobytes()
+
+    name = os.path.splitext(os.path.basename(path))[0]
+    header = glb_header(name, len(position_bytes), len(index_bytes), positions.shape[0], indices.size,
+                        positions.min(axis=0).tolist() if positions.shape[0] else [0, 0, 0],
+                        positions.max(axis=0).tolist() if positions.shape[0] else [0, 0, 0])
+    with open(path, "wb") as glb_file:
+        return glb_file.write(header + _pad(position_bytes, b"\0") + _pad(index_bytes, b"\0"))
+
+# Output formats selectable with the "Format" option, by file extension.
+EXPORTERS = {
+    "obj": write_obj,
+    "stl": write_stl,
+    "glb": write_glb,
+}
+
+class MeshStream(ABC):
+    """
+    Writes a mesh to a file chunk by chunk, so only one chunk has to be held in memory.
+    Every chunk's faces index its own vertices from 1, the running vertex offset is added here.
+    Used as a context manager, the file is completed when the block exits, or removed when
+    the block raises.
+
+    Parameters
+    ----------
+    path : str
+        The output file.
+    decimals : int
+        Number of decimal places written for the coordinates, where the format is text.
+    """
+    def __init__(self, path: str, decimals: int) -> None:
+        self.path = path
+        self.decimals = decimals
+        self.vertex_count = 0
+
+    def write(self, vertices: np.ndarray, faces: list[np.ndarray]) -> None:
+        """
+        Append a chunk: its (V,3) vertices and face blocks of 1-based indices into them.
+        """
+        self._write(vertices, faces)
+        self.vertex_count += len(vertices)
+
+    @abstractmethod
+    def _write(self, vertices: np.ndarray, faces: list[np.ndarray]) -> None:
+        """
+        Write a chunk, its faces still indexing its own vertices from 1.
+        """
+
+    @abstractmethod
+    def close(self) -> None:
+        """
+        Complete the file and release its handles.
+        """
+
+    @abstractmethod
+    def _release(self) -> None:
+        """
+        Close the file and temporary files without completing the file.
+        """
+
+    def discard(self) -> None:
+        """
+        Close without completing the file and remove what was written of it.
+        """
+        self._release()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self) -> "MeshStream":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is not None:
+            self.discard()
+            return
+        try:
+            self.close()
+        except BaseException:
+            self.discard()
+            raise
+
+class ObjStream(MeshStream):
+    """
+    Streams an OBJ file. Vertices are written as they come while the renumbered faces are
+    spooled to temporary files, one per arity, and appended on close, so the file is laid out
+    like write_obj's.
+    """
+    def __init__(self, path: str, decimals: int) -> None:
+        super().__init__(path, decimals)
+        self.value_format = f"%.{max(decimals, 0)}f"
+        self.spools = {}
+        self.file = open(path, "w")
+
+    def _write(self, vertices, faces) -> None:
+        self.file.write(format_rows("v", self.value_format, np.asarray(vertices, dtype=float) + 0.0))
+        for block in faces:
+            block = np.asarray(block)
+            if block.shape[0] == 0:
+                continue
+            if block.shape[1] not in self.spools:
+                self.spools[block.shape[1]] = tempfile.TemporaryFile("w+")
+            self.spools[block.shape[1]].write(format_rows("f", "%d", block + self.vertex_count))
+
+    def close(self) -> None:
+        try:
+            if not self.file.closed:
+                # Quads before triangles, the order of ModelGeometry.select.
+                for arity in sorted(self.spools, reverse=True):
+                    self.spools[arity].seek(0)
+                    shutil.copyfileobj(self.spools[arity], self.file)
+        finally:
+            self._release()
+
+    def _release(self) -> None:
+        self.file.close()
+        for spool in self.spools.values():
+            spool.close()
+
+class StlStream(MeshStream):
+    """
+    Streams a binary STL file, its triangle count is written over the header on close.
+    """
+    def __init__(self, path: str, decimals: int) -> None:
+        super().__init__(path, decimals)
+        self.triangle_count = 0
+        self.file = open(path, "wb")
+        self.file.write(stl_header(0))
+
+    def _write(self, vertices, faces) -> None:
+        records = stl_records(vertices, faces)
+        self.file.write(records.tobytes())
+        self.triangle_count += records.shape[0]
+
+    def close(self) -> None:
+        try:
+            if not self.file.closed:
+                self.file.seek(0)
+                self.file.write(stl_header(self.triangle_count))
+        finally:
+            self._release()
+
+    def _release(self) -> None:
+        self.file.close()
+
+class GlbStream(MeshStream):
+    """
+    Streams a binary glTF (GLB) file. The JSON chunk needs the sizes and bounds of the whole mesh,
+    so positions and indices are spooled to temporary files and copied behind it on close.
+    """
+    def __init__(self, path: str, decimals: int) -> None:
+        super().__init__(path, decimals)
+        self.index_count = 0
+        self.minimum = np.full(3, np.inf, dtype="<f4")
+        self.maximum = np.full(3, -np.inf, dtype="<f4")
+        self.positions = tempfile.TemporaryFile()
+        self.indices = tempfile.TemporaryFile()
+
+    def _write(self, vertices, faces) -> None:
+        positions = np.ascontiguousarray(vertices, dtype="<f4")
+        if positions.shape[0]:
+            self.minimum = np.minimum(self.minimum, positions.min(axis=0))
+            self.maximum = np.maximum(self.maximum, positions.max(axis=0))
+        indices = np.ascontiguousarray(triangulate(faces) + self.vertex_count, dtype="<u4")
+        self.positions.write(positions.tobytes())
+        self.indices.write(indices.tobytes())
+        self.index_count += indices.size
+
+    def close(self) -> None:
+        try:
+            if self.positions.closed:
+                return
+            position_bytes, index_bytes = self.positions.tell(), self.indices.tell()
+            bounds = (self.minimum.tolist(), self.maximum.tolist()) if self.vertex_count else ([0, 0, 0], [0, 0, 0])
+            name = os.path.splitext(os.path.basename(self.path))[0]
+            with open(self.path, "wb") as glb_file:
+                glb_file.write(glb_header(name, position_bytes, index_bytes, self.vertex_count, self.index_count, *bounds))
+                for spool, size in ((self.positions, position_bytes), (self.indices, index_bytes)):
+                    spool.seek(0)
+                    shutil.copyfileobj(spool, glb_file)
+                    glb_file.write(b"\0" * (-size % 4))
+        finally:
+            self._release()
+
+    def _release(self) -> None:
+        self.positions.close()
+        self.indices.close()
+
+# Chunked writers of the "Format" option, used when the views are streamed.
+STREAMS = {
+    "obj": ObjStream,
+    "stl": StlStream,
+    "glb": GlbStream,
+}
@@ -0,0 +1,494 @@
+import functools
+import logging
+
+import numpy as np
+
+import profiling
+import spatial
+
+# Face topology of a rectangular prism, 1-based and local to the member.
+RECT_FACES = np.array([
+    [1, 4, 3, 2],  # Bottom face, wound opposite the top face
+    [5, 6, 7, 8],  # Top face
+    [1, 2, 6, 5],  # Side face
+    [2, 3, 7, 6],  # Side face
+    [3, 4, 8, 7],  # Side face
+    [4, 1, 5, 8]   # Side face
+])
+RECT_VERTEX_COUNT = 8
+
+# The 2D projection views, in the order of the extreme coordinate they lie on (min x, max x, min y, ...).
+VIEWS = ('YZ_1', 'YZ_2', 'XZ_1', 'XZ_2', 'XY_1', 'XY_2')
+
+def _norms(vectors: np.ndarray) -> np.ndarray:
+    # matmul reduces each row the same way np.linalg.norm does for a single vector,
+    # which keeps the batched results bit for bit identical to the per-member path.
+    return np.sqrt(np.matmul(vectors[:, None, :], vectors[:, :, None])[:, 0, 0])
+
+@profiling.counted
+def member_arrays(members, nodes) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Gather the geometry inputs of a list of members into flat arrays.
+    Works with both RISA-3D and Modelsmart members.
+
+    Parameters
+    ----------
+    members : list
+        A list of Member instances.
+    nodes : list
+        A list of Node or Joint instances.
+
+    Returns
+    -------
+    tuple[np.ndarray, ...]
+        The (N,3) i and j coordinates followed by the (N,) rotations, widths, heights and radii.
+    """
+    count = len(members)
+    i_coords = np.empty((count, 3))
+    j_coords = np.empty((count, 3))
+    props = np.empty((4, count))
+    for idx, member in enumerate(members):
+        i_coords[idx] = member.get_i_coordinates(nodes)
+        j_coords[idx] = member.get_j_coordinates(nodes)
+        props[:, idx] = (member.rotation, member.width, member.height, member.radius)
+    return i_coords, j_coords, props[0], props[1], props[2], props[3]
+
+@profiling.counted
+def view_masks(i_coords: np.ndarray, j_coords: np.ndarray, node_coords: np.ndarray,
+               index: spatial.SpatialIndex = None) -> dict[str, np.ndarray]:
+    """
+    Tag the members that lie on each of the six extreme planes of the model with plane queries
+    on a spatial index. A member belongs to a view when both of its ends lie exactly on the plane,
+    like Member.set_views.
+
+    Parameters
+    ----------
+    i_coords, j_coords : np.ndarray
+        (N,3) coordinates of the i and j nodes.
+    node_coords : np.ndarray
+        (K,3) coordinates of every node of the model.
+    index : spatial.SpatialIndex, optional
+        The index of the members, built from i_coords and j_coords if not given.
+
+    Returns
+    -------
+    dict[str, np.ndarray]
+        A (N,) boolean mask per view name, including '3D'.
+    """
+    masks = {'3D': np.ones(i_coords.shape[0], dtype=bool)}
+    if node_coords.shape[0] == 0:
+        for view in VIEWS:
+            masks[view] = np.zeros(i_coords.shape[0], dtype=bool)
+        return masks
+    if index is None:
+        index = spatial.SpatialIndex(i_coords, j_coords)
+    extremes = (node_coords.min(axis=0), node_coords.max(axis=0))
+    for idx, view in enumerate(VIEWS):
+        axis = idx // 2
+        masks[view] = index.mask(index.plane(axis, extremes[idx % 2][axis]))
+    return masks
+
+def rotation_matrices(axes: np.ndarray, angles: np.ndarray) -> np.ndarray:
+    """
+    Batched Rodrigues' Rotation Formula.
+
+    Parameters
+    ----------
+    axes : np.ndarray
+        (N,3) normalized rotation axes.
+    angles : np.ndarray
+        (N,) rotation angles in degrees.
+
+    Returns
+    -------
+    np.ndarray
+        (N,3,3) rotation matrices.
+    """
+    angles = np.radians(angles)
+    cos_theta = np.cos(angles)
+    sin_theta = np.sin(angles)
+    one_minus_cos = 1 - cos_theta
+
+    x, y, z = axes[:, 0], axes[:, 1], axes[:, 2]
+    rot = np.empty((axes.shape[0], 3, 3))
+    rot[:, 0, 0] = cos_theta + x * x * one_minus_cos
+    rot[:, 0, 1] = x * y * one_minus_cos - z * sin_theta
+    rot[:, 0, 2] = x * z * one_minus_cos + y * sin_theta
+    rot[:, 1, 0] = y * x * one_minus_cos + z * sin_theta
+    rot[:, 1, 1] = cos_theta + y * y * one_minus_cos
+    rot[:, 1, 2] = y * z * one_minus_cos - x * sin_theta
+    rot[:, 2, 0] = z * x * one_minus_cos - y * sin_theta
+    rot[:, 2, 1] = z * y * one_minus_cos + x * sin_theta
+    rot[:, 2, 2] = cos_theta + z * z * one_minus_cos
+    return rot
+
+@profiling.counted
+def face_vectors(i_coords: np.ndarray, j_coords: np.ndarray, rotation: np.ndarray = None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    The unit direction of every member and two unit vectors orthogonal to it spanning its cross
+    section, turned by the member's rotation about its axis.
+    Members with a zero length direction vector must be removed beforehand.
+
+    Parameters
+    ----------
+    i_coords : np.ndarray
+        (N,3) coordinates of the i-nodes.
+    j_coords : np.ndarray
+        (N,3) coordinates of the j-nodes.
+    rotation : np.ndarray, optional
+        (N,) rotation angles in degrees, by default no rotation.
+
+    Returns
+    -------
+    tuple[np.ndarray, np.ndarray, np.ndarray]
+        The (N,3) direction vectors, and the two (N,3) orthogonal vectors (v1, v2).
+    """
+    dir_vec = j_coords - i_coords
+    dir_vec = dir_vec / _norms(dir_vec)[:, None]
+    unit_norm = dir_vec / _norms(dir_vec)[:, None]
+
+    # Use the y-axis if aligned with the x-axis, the z-axis if aligned with the y-axis and the x-axis otherwise
+    x_aligned = np.isclose(unit_norm, [1, 0, 0]).all(axis=1) | np.isclose(unit_norm, [-1, 0, 0]).all(axis=1)
+    y_aligned = np.isclose(unit_norm, [0, 1, 0]).all(axis=1) | np.isclose(unit_norm, [0, -1, 0]).all(axis=1)
+    temp_vector = np.zeros_like(unit_norm)
+    temp_vector[x_aligned, 1] = 1
+    temp_vector[~x_aligned & y_aligned, 2] = 1
+    temp_vector[~x_aligned & ~y_aligned, 0] = 1
+
+    v1 = np.cross(unit_norm, temp_vector)
+    v1 = v1 / _norms(v1)[:, None]
+    v2 = np.cross(unit_norm, v1)
+    v2 = v2 / _norms(v2)[:, None]
+
+    if rotation is not None:
+        rotated = rotation != 0
+        if rotated.any():
+            rot = rotation_matrices(dir_vec[rotated], rotation[rotated])
+            v1[rotated] = np.matmul(rot, v1[rotated][:, :, None])[:, :, 0]
+            v2[rotated] = np.matmul(rot, v2[rotated][:, :, None])[:, :, 0]
+
+    return dir_vec, v1, v2
+
+@profiling.counted
+def rect_vertices(i_coords: np.ndarray, j_coords: np.ndarray, rotation: np.ndarray, width: np.ndarray, height: np.ndarray) -> np.ndarray:
+    """
+    The corners of the rectangular prism of every member, width along v1 and height along v2
+    of face_vectors, in the vertex order of RECT_FACES.
+
+    Returns
+    -------
+    np.ndarray
+        (N,8,3) array with the four corners of each end face cap.
+    """
+    _, v1, v2 = face_vectors(i_coords, j_coords, rotation)
+
+    half_width_vec = (width / 2)[:, None] * v1
+    half_height_vec = (height / 2)[:, None] * v2
+
+    corners = np.empty((i_coords.shape[0], RECT_VERTEX_COUNT, 3))
+    for end, vec in ((0, i_coords), (4, j_coords)):
+        corners[:, end + 0] = vec + half_width_vec + half_height_vec
+        corners[:, end + 1] = vec - half_width_vec + half_height_vec
+        corners[:, end + 2] = vec - half_width_vec - half_height_vec
+        corners[:, end + 3] = vec + half_width_vec - half_height_vec
+    return corners
+
+@functools.lru_cache(maxsize=None)
+def unit_circle(circle_size: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Cosine and sine of the circle_size ring angles, computed once per circle size.
+
+    Returns
+    -------
+    tuple[np.ndarray, np.ndarray]
+        Read-only (circle_size,) arrays.
+    """
+    angles = np.arange(circle_size) * (2*np.pi/circle_size)
+    cos, sin = np.cos(angles), np.sin(angles)
+    cos.flags.writeable = False
+    sin.flags.writeable = False
+    return cos, sin
+
+@functools.lru_cache(maxsize=None)
+def circ_faces(circle_size: int) -> np.ndarray:
+    """
+    Face topology of a cylinder with circle_size sides, 1-based and local to the member.
+    Vertex 1 is the i-end centre followed by its ring, vertex circle_size+2 the j-end centre
+    followed by its ring. Built once per circle size and returned read-only.
+
+    Returns
+    -------
+    np.ndarray
+        (4*circle_size,3) triangles: the i cap, the j cap, then two triangles per side.
+    """
+    ring = np.arange(circle_size)
+    i_ring, i_next = 2 + ring, 2 + (ring + 1) % circle_size
+    j_ring, j_next = i_ring + circle_size + 1, i_next + circle_size + 1
+    faces = np.concatenate([
+        np.stack([np.ones_like(ring), i_next, i_ring], axis=1),  # i-node cap
+        np.stack([np.full_like(ring, circle_size + 2), j_ring, j_next], axis=1),  # j-node cap, wound opposite the i cap
+        np.stack([i_ring, i_next, j_ring], axis=1),  # i->j sides
+        np.stack([i_next, j_next, j_ring], axis=1),  # j->i sides
+    ])
+    faces.flags.writeable = False
+    return faces
+
+@profiling.counted
+def circ_vertices(i_coords: np.ndarray, j_coords: np.ndarray, radius: np.ndarray, circle_size: int) -> np.ndarray:
+    """
+    The vertices of the cylinder of every member, in the vertex order of circ_faces. The ring
+    radius is half the member's radius value. Every member is generated by one broadcast.
+
+    Returns
+    -------
+    np.ndarray
+        (N,2*circle_size+2,3) array with the centre and ring vertices of each end cap.
+    """
+    _, v1, v2 = face_vectors(i_coords, j_coords)
+
+    half_width_vect = v1 * radius[:, None] / 2
+    half_height_vect = v2 * radius[:, None] / 2
+
+    cos, sin = unit_circle(circle_size)
+    cos = cos[None, :, None]
+    sin = sin[None, :, None]
+
+    corners = np.empty((i_coords.shape[0], 2*circle_size + 2, 3))
+    for end, vec in ((0, i_coords), (circle_size + 1, j_coords)):
+        corners[:, end] = vec
+        corners[:, end + 1:end + circle_size + 1] = vec[:, None, :] + cos*half_width_vect[:, None, :] + sin*half_height_vect[:, None, :]
+    return corners
+
+def adaptive_circle_sizes(ring_radius: np.ndarray, tolerance: float, min_size: int, max_size: int) -> np.ndarray:
+    """
+    The number of sides each cylinder needs for its polygon to stay within a chordal error
+    of its true circle: a ring of radius r with n sides deviates by r*(1 - cos(pi/n)).
+
+    Parameters
+    ----------
+    ring_radius : np.ndarray
+        (N,) radius of each cylinder's ring.
+    tolerance : float
+        The largest allowed chordal error, in model units.
+    min_size, max_size : int
+        The bounds of the number of sides.
+
+    Returns
+    -------
+    np.ndarray
+        (N,) number of sides.
+    """
+    ring_radius = np.abs(np.asarray(ring_radius, dtype=float))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        half_angle = np.arccos(np.clip(1 - tolerance / ring_radius, -1, 1))
+        sizes = np.ceil(np.pi / half_angle)
+    sizes = np.nan_to_num(sizes, nan=max_size, posinf=max_size)
+    return np.clip(sizes, min_size, max_size).astype(np.int64)
+
+def model_size(node_coords: np.ndarray) -> float:
+    """
+    The diagonal of the bounding box of the nodes.
+    """
+    if node_coords.shape[0] == 0:
+        return 0.0
+    return float(np.linalg.norm(node_coords.max(axis=0) - node_coords.min(axis=0)))
+
+class ModelGeometry:
+    """
+    The vertices of every member of a model, generated once and shared by all of its views.
+    Members with a radius are meshed as cylinders, every other member as a rectangular prism.
+    Vertices are laid out in member order exactly like the per-member functions in convert,
+    member k owning vertices[offsets[k]:offsets[k] + counts[k]].
+
+    Parameters
+    ----------
+    i_coords, j_coords : np.ndarray
+        (N,3) coordinates of the i and j nodes.
+    rotation, width, height, radius : np.ndarray
+        (N,) member properties, see member_arrays.
+    circle_size : int or np.ndarray
+        Number of sides of the generated cylinders, or a (N,) array of them per member,
+        see adaptive_circle_sizes.
+    decimals : int, optional
+        Round the vertices to this many decimal places, by default no rounding.
+    """
+    @profiling.counted
+    def __init__(self, i_coords, j_coords, rotation, width, height, radius, circle_size, decimals: int = None) -> None:
+        self.circle_size = circle_size
+        self.circular = radius != 0
+        self.circle_sizes = np.where(self.circular, np.asarray(circle_size, dtype=np.int64), 0)
+        # Zero length members own no vertices and are left out of every view.
+        self.valid = ~np.all(i_coords == j_coords, axis=1)
+        if not self.valid.all():
+            logging.error(f"Direction vector has zero length for {np.count_nonzero(~self.valid)} member(s), skipping.")
+
+        # Members with a zero width or height are flat and enclose no volume.
+        self.solid = self.valid & (self.circular | (width * height != 0))
+
+        self.counts = np.where(self.circular, 2*self.circle_sizes + 2, RECT_VERTEX_COUNT) * self.valid
+        self.offsets = np.cumsum(self.counts) - self.counts
+
+        self.vertices = np.empty((int(self.counts.sum()), 3))
+        rect = ~self.circular & self.valid
+        if rect.any():
+            corners = rect_vertices(i_coords[rect], j_coords[rect], rotation[rect], width[rect], height[rect])
+            self.vertices[self.offsets[rect][:, None] + np.arange(RECT_VERTEX_COUNT)] = corners
+        circular = self.circular & self.valid
+        # Cylinders are generated in one broadcast per number of sides.
+        for size in np.unique(self.circle_sizes[circular]).tolist():
+            group = circular & (self.circle_sizes == size)
+            corners = circ_vertices(i_coords[group], j_coords[group], radius[group], size)
+            self.vertices[self.offsets[group][:, None] + np.arange(2*size + 2)] = corners
+        if decimals is not None:
+            self.round(decimals)
+
+    def round(self, decimals: int) -> None:
+        """
+        Round the vertices to this many decimal places.
+        """
+        self.vertices = np.round(self.vertices, decimals=decimals)
+
+    def __len__(self) -> int:
+        return self.counts.shape[0]
+
+    @profiling.counted
+    def select(self, selection: np.ndarray = None) -> tuple[np.ndarray, list[np.ndarray]]:
+        """
+        Extract the mesh of a subset of the members.
+
+        Parameters
+        ----------
+        selection : np.ndarray, optional
+            Boolean mask or indices of the members to include, by default all of them.
+
+        Returns
+        -------
+        tuple[np.ndarray, list[np.ndarray]]
+            The (V,3) vertices and a list of face blocks, one 2D array of 1-based indices per face arity.
+        """
+        members = np.arange(len(self)) if selection is None else np.arange(len(self))[selection]
+        members = members[self.valid[members]]
+        counts = self.counts[members]
+        new_offsets = np.cumsum(counts) - counts
+
+        # Every selected member's vertex range, shifted from its cached offset to its offset in the view.
+        index = np.arange(int(counts.sum())) + np.repeat(self.offsets[members] - new_offsets, counts)
+        vertices = self.vertices[index]
+
+        faces = []
+        circular = self.circular[members]
+        if (~circular).any():
+            faces.append((RECT_FACES[None, :, :] + new_offsets[~circular][:, None, None]).reshape(-1, 4))
+        if circular.any():
+            sizes = self.circle_sizes[members]
+            triangles = []
+            for size in np.unique(sizes[circular]).tolist():
+                group = circular & (sizes == size)
+                triangles.append((circ_faces(size)[None, :, :] + new_offsets[group][:, None, None]).reshape(-1, 3))
+            faces.append(np.concatenate(triangles))
+        return vertices, faces
+
+    @profiling.counted
+    def signed_volumes(self) -> np.ndarray:
+        """
+        The signed volume enclosed by the mesh of every member, positive when its faces are
+        wound counter-clockwise seen from outside, as the STL normals and glTF front faces expect.
+
+        Returns
+        -------
+        np.ndarray
+            (N,) volumes, zero for the members without vertices.
+        """
+        vertices, faces = self.select()
+        # Fan triangulation, every triangle tagged with the member owning its first vertex.
+        triangles = [block[:, [0, k, k + 1]] - 1 for block in faces for k in range(1, block.shape[1] - 1)]
+        triangles = np.concatenate(triangles) if triangles else np.empty((0, 3), dtype=np.int64)
+        members = np.flatnonzero(self.valid)
+        counts = self.counts[members]
+        starts = np.cumsum(counts) - counts
+        owners = np.searchsorted(starts, triangles[:, 0], side='right') - 1
+        # Measured from the first vertex of the member, the volume of a closed mesh does not depend
+        # on the origin and a nearby one avoids cancellation far from the model origin.
+        corners = vertices[triangles] - vertices[starts[owners]][:, None, :]
+        tetrahedra = np.einsum('ij,ij->i', corners[:, 0], np.cross(corners[:, 1], corners[:, 2])) / 6
+        volumes = np.zeros(len(self))
+        volumes[members] = np.bincount(owners, weights=tetrahedra, minlength=members.shape[0])
+        return volumes
+
+    def check_winding(self) -> bool:
+        """
+        Check that the mesh of every solid member encloses a positive volume, which fails
+        when its faces are wound inwards or inconsistently.
+
+        Returns
+        -------
+        bool
+            True if every solid member is wound outwards.
+        """
+        inverted = self.solid & (self.signed_volumes() <= 0)
+        if inverted.any():
+            logging.error(f"Faces are not wound outwards for {np.count_nonzero(inverted)} member(s): "
+                          f"{np.flatnonzero(inverted)[:10].tolist()}")
+            return False
+        return True
+
+def iter_chunks(i_coords, j_coords, rotation, width, height, radius, circle_size, members: np.ndarray,
+                chunk_size: int, decimals: int = None):
+    """
+    Generate the mesh of a subset of the members in batches of chunk_size members,
+    so memory is bounded by the batch rather than by the model.
+
+    Parameters
+    ----------
+    i_coords, j_coords : np.ndarray
+        (N,3) coordinates of the i and j nodes.
+    rotation, width, height, radius : np.ndarray
+        (N,) member properties, see member_arrays.
+    circle_size : int or np.ndarray
+        Number of sides of the generated cylinders, or a (N,) array of them per member.
+    members : np.ndarray
+        Indices of the members to mesh, in output order.
+    chunk_size : int
+        Number of members per batch.
+    decimals : int, optional
+        Round the vertices to this many decimal places, by default no rounding.
+
+    Yields
+    ------
+    tuple[np.ndarray, list[np.ndarray]]
+        The vertices of a batch and its face blocks, 1-based indices into the batch's vertices.
+    """
+    sizes = np.broadcast_to(np.asarray(circle_size, dtype=np.int64), radius.shape)
+    for start in range(0, len(members), chunk_size):
+        batch = members[start:start + chunk_size]
+        yield ModelGeometry(i_coords[batch], j_coords[batch], rotation[batch], width[batch], height[batch],
+                            radius[batch], sizes[batch], decimals).select()
+
+@profiling.counted
+def weld(vertices: np.ndarray, faces: list[np.ndarray]) -> tuple[np.ndarray, list[np.ndarray]]:
+    """
+    Merge bit-identical vertices and remap the faces onto the merged vertices.
+    Meant to run after rounding, which makes coincident corners of neighbouring members identical.
+    The merged vertices keep the order of their first occurrence.
+
+    Parameters
+    ----------
+    vertices : np.ndarray
+        (V,3) vertex coordinates.
+    faces : list[np.ndarray]
+        Face blocks of 1-based vertex indices.
+
+    Returns
+    -------
+    tuple[np.ndarray, list[np.ndarray]]
+        The unique vertices and the remapped face blocks.
+    """
+    if len(vertices) == 0:
+        return vertices, faces
+    # Adding zero turns -0.0 into 0.0 so both compare equal.
+    _, first, inverse = np.unique(vertices + 0.0, axis=0, return_index=True, return_inverse=True)
+    order = np.argsort(first)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(order.shape[0])
+    remap = rank[inverse.reshape(-1)] + 1
+    return vertices[first[order]], [remap[block - 1] for block in faces]
@@ -0,0 +1,147 @@
+"""
+Incremental re-export: a fingerprint of every view is kept next to its output files
+so a rerun only regenerates the views whose members or options changed.
+"""
+import hashlib
+import json
+import logging
+import os
+
+import numpy as np
+
+from model import Model
+
+# Bump when the generated geometry changes for the same inputs, every view is then rewritten once.
+FINGERPRINT_VERSION = 1
+# Prefix of the stored fingerprint of a view without members, which has no output file.
+EMPTY = "empty:"
+
+def manifest_path(folder: str, filename: str) -> str:
+    return os.path.join(folder, f".{filename}.views.json")
+
+def view_fingerprints(model: Model, masks: dict[str, np.ndarray], views: list[str], options) -> dict[str, str]:
+    """
+    Hash the inputs of gen_view for each view: the geometry of its members and the
+    options that change the generated file.
+
+    Parameters
+    ----------
+    model : Model
+        The parsed model.
+    masks : dict[str, np.ndarray]
+        The view masks from Model.assign_views.
+    views : list[str]
+        The view names.
+    options : dict
+        The conversion options.
+
+    Returns
+    -------
+    dict[str, str]
+        The hex digest of every view.
+    """
+    settings = json.dumps([FINGERPRINT_VERSION, int(options["Cyl"]), int(options["Prec"]),
+                           bool(options.get("Weld")), options.get("Format", "obj"),
+                           options.get("CylTol"), options.get("CylMin"), options.get("CylMax")]).encode()
+    # Adaptive cylinders depend on the model size, which any node can change.
+    if options.get("CylTol") and len(model.node_coords):
+        settings += np.stack([model.node_coords.min(axis=0), model.node_coords.max(axis=0)]).tobytes()
+    columns = (model.i_coords, model.j_coords, model.rotation, model.width, model.height, model.radius)
+    fingerprints = {}
+    for view in views:
+        digest = hashlib.sha256(settings)
+        selection = masks[view]
+        for column in columns:
+            digest.update(np.ascontiguousarray(column[selection]).tobytes())
+        fingerprints[view] = digest.hexdigest()
+    return fingerprints
+
+def load(folder: str, filename: str) -> dict[str, str]:
+    """
+    Read the stored fingerprints of a file's views, empty if there are none or they are unreadable.
+    """
+    try:
+        with open(manifest_path(folder, filename), 'r') as manifest:
+            fingerprints = json.load(manifest)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logging.error(f"Ignoring unreadable view fingerprints of {filename}: {e}")
+        return {}
+    return fingerprints if isinstance(fingerprints, dict) else {}
+
+def save(folder: str, filename: str, fingerprints: dict[str, str]) -> None:
+    """
+    Store the fingerprints of a file's views next to its output files.
+    """
+    path = manifest_path(folder, filename)
+    try:
+        with open(path + ".tmp", 'w') as manifest:
+            json.dump(fingerprints, manifest, indent=1, sort_keys=True)
+        os.replace(path + ".tmp", path)
+    except OSError as e:
+        logging.error(f"Could not store the view fingerprints of {filename}: {e}")
+
+def changed_views(views: list[str], fingerprints: dict[str, str], stored: dict[str, str], out_path) -> list[str]:
+    """
+    The views to regenerate: those with a new fingerprint or whose output file is missing.
+    A view stored as empty with its current fingerprint still has no members and is skipped.
+
+    Parameters
+    ----------
+    views : list[str]
+        The requested view names.
+    fingerprints : dict[str, str]
+        The current fingerprints, see view_fingerprints.
+    stored : dict[str, str]
+        The fingerprints of the last export, see load.
+    out_path : callable
+        Gives the output file path of a view name.
+
+    Returns
+    -------
+    list[str]
+        The view names, in the order of views.
+    """
+    def unchanged(view: str) -> bool:
+        if stored.get(view) == EMPTY + fingerprints[view]:
+            return True
+        return stored.get(view) == fingerprints[view] and os.path.exists(out_path(view))
+    return [view for view in views if not unchanged(view)]
+
+def update(stored: dict[str, str], views: list[str], fingerprints: dict[str, str], written: list[str],
+           empty: list[str]) -> None:
+    """
+    Record the result of an export in the stored fingerprints: the fingerprint of every view
+    written, the empty marker of every view without members, and no entry for a view that failed.
+
+    Parameters
+    ----------
+    stored : dict[str, str]
+        The fingerprints of the last export, updated in place.
+    views : list[str]
+        The views that were exported.
+    fingerprints : dict[str, str]
+        Their current fingerprints.
+    written, empty : list[str]
+        The views written and the views without members.
+    """
+    for view in views:
+        if view in written:
+            stored[view] = fingerprints[view]
+        elif view in empty:
+            stored[view] = EMPTY + fingerprints[view]
+        else:
+            stored.pop(view, None)
+
+def forget(folder: str, filename: str, views: list[str]) -> None:
+    """
+    Drop the stored fingerprints of views exported without fingerprinting, whose files may now
+    differ from what the fingerprints describe. Does nothing when there is no manifest.
+    """
+    if not os.path.exists(manifest_path(folder, filename)):
+        return
+    stored = load(folder, filename)
+    for view in views:
+        stored.pop(view, None)
+    save(folder, filename, stored)
@@ -0,0 +1,114 @@
+"""
+Per-stage instrumentation of a file conversion: wall time and peak traced memory of each
+stage, member/vertex/face counts and bytes written. One JSON-lines record is appended per
+file and one per view to the metrics file, and every stage's time is logged.
+"""
+import contextlib
+import json
+import logging
+import os
+import time
+import tracemalloc
+
+class Recorder:
+    """
+    Collects the metrics of one file conversion.
+
+    Parameters
+    ----------
+    path : str or None
+        The JSON-lines file the records are appended to, None only logs the stage times.
+    filepath : str
+        The converted file.
+    trace_memory : bool, optional
+        Also measure the peak traced memory of each stage. Off by default,
+        tracemalloc slows the formatting of large OBJ files down several times.
+    """
+    def __init__(self, path: str, filepath: str, trace_memory: bool = False) -> None:
+        self.path = path
+        self.filepath = filepath
+        self.trace_memory = trace_memory
+        self.stages = {}
+        self.views = {}
+        self.fields = {}
+        self._started = time.perf_counter()
+        self._own_trace = False
+        # Running peak of every open stage, nested stages reset the tracemalloc peak.
+        self._peaks = []
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._own_trace = True
+
+    @contextlib.contextmanager
+    def stage(self, name: str, view: str = None):
+        """
+        Time a stage of the conversion, or of one view when view is given.
+        A stage entered several times accumulates its time and keeps its highest peak.
+        """
+        if self.trace_memory:
+            if self._peaks:
+                self._peaks[-1] = max(self._peaks[-1], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            self._peaks.append(0)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            if self.trace_memory:
+                peak = max(self._peaks.pop(), tracemalloc.get_traced_memory()[1])
+                if self._peaks:
+                    self._peaks[-1] = max(self._peaks[-1], peak)
+            record = self.views.setdefault(view, {}) if view is not None else self.stages
+            entry = record.setdefault(name, {"seconds": 0.0})
+            entry["seconds"] += seconds
+            if self.trace_memory:
+                entry["peak_bytes"] = max(entry.get("peak_bytes", 0), peak)
+            if view is None:
+                logging.info(f"{name} took {seconds:.3f}s")
+
+    def count(self, view: str = None, **fields) -> None:
+        """
+        Record counts such as members, vertices or bytes_written, for the file or one view.
+        """
+        record = self.views.setdefault(view, {}) if view is not None else self.fields
+        record.update(fields)
+
+    def records(self, converted: bool) -> list[dict]:
+        """
+        The file record followed by one record per view.
+        """
+        stages = self.stages
+        record = {"type": "file", "file": self.filepath, "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                  "converted": converted, "seconds": time.perf_counter() - self._started, **self.fields,
+                  "stages": stages}
+        if self.trace_memory:
+            record["peak_bytes"] = max((values.get("peak_bytes", 0) for values in stages.values()), default=0)
+        views = [{"type": "view", "file": self.filepath, "view": view, **values} for view, values in self.views.items()]
+        return [record] + views
+
+    def close(self, converted: bool) -> None:
+        """
+        Stop tracing memory and append the records to the metrics file.
+        """
+        if self._own_trace:
+            tracemalloc.stop()
+            self._own_trace = False
+        if not self.path:
+            return
+        text = "".join(json.dumps(record) + "\n" for record in self.records(converted))
+        try:
+            # A single O_APPEND write per file keeps the records of parallel workers from interleaving.
+            handle = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(handle, text.encode())
+            finally:
+                os.close(handle)
+        except OSError as e:
+            logging.error(f"Could not write metrics to {self.path}: {e}")
+
+def stage(recorder, name: str, view: str = None):
+    """
+    recorder.stage, or a context that does nothing when recorder is None.
+    """
+    return contextlib.nullcontext() if recorder is None else recorder.stage(name, view)
@@ -0,0 +1,247 @@
+import numpy as np
+
+import geometry as geo
+import profiling
+import spatial
+
+# The numeric fields of a Model, in the order of its constructor arguments.
+ARRAY_FIELDS = ('node_coords', 'i_index', 'j_index', 'rotation', 'width', 'height', 'radius', 'thickness')
+
+class Model:
+    """
+    Columnar (struct-of-arrays) representation of a structural model, filled by both parsers.
+    Only the data the geometry needs is kept, one array per field instead of one object per row.
+    The nodes and members attributes give lazy per-row views for code written against the
+    Node/Joint and Member classes.
+
+    Parameters
+    ----------
+    node_coords : np.ndarray
+        (N,3) node coordinates.
+    i_index, j_index : np.ndarray
+        (M,) 0-based indices of each member's end nodes into node_coords.
+    rotation, width, height, radius : np.ndarray
+        (M,) member rotation in degrees and section dimensions, radius is 0 for rectangular sections.
+    thickness : np.ndarray, optional
+        (M,) section wall thickness, zero by default.
+    node_labels, member_labels : list[str], optional
+        Labels of the nodes and members, by default their 1-based numbers.
+    """
+    def __init__(self, node_coords, i_index, j_index, rotation, width, height, radius,
+                 thickness=None, node_labels=None, member_labels=None) -> None:
+        self.node_coords = np.asarray(node_coords, dtype=float).reshape(-1, 3)
+        self.i_index = np.asarray(i_index, dtype=np.int64)
+        self.j_index = np.asarray(j_index, dtype=np.int64)
+        self.rotation = np.asarray(rotation, dtype=float)
+        self.width = np.asarray(width, dtype=float)
+        self.height = np.asarray(height, dtype=float)
+        self.radius = np.asarray(radius, dtype=float)
+        self.thickness = np.zeros_like(self.radius) if thickness is None else np.asarray(thickness, dtype=float)
+        self.node_labels = node_labels
+        self.member_labels = member_labels
+        # Bit k is set when the member lies on geometry.VIEWS[k], every member is in the 3D view.
+        self.views = np.zeros(self.i_index.shape[0], dtype=np.uint8)
+        self.nodes = Rows(self, NodeView, self.node_coords.shape[0])
+        self.members = Rows(self, MemberView, self.i_index.shape[0])
+        self._spatial_index = None
+
+    @classmethod
+    def from_objects(cls, nodes, members) -> "Model":
+        """
+        Build a Model from lists of Node/Joint and Member instances of either parser.
+        """
+        _, _, rotation, width, height, radius = geo.member_arrays(members, nodes)
+        node_coords = np.array([node.get_coordinates() for node in nodes], dtype=float).reshape(-1, 3)
+        # Members reference nodes by 1-based position, like get_i_coordinates does.
+        i_index = np.array([getattr(member, 'inode', getattr(member, 'start_joint', 0)) for member in members], dtype=np.int64) - 1
+        j_index = np.array([getattr(member, 'jnode', getattr(member, 'end_joint', 0)) for member in members], dtype=np.int64) - 1
+        thickness = np.array([getattr(member, 'thickness', 0) for member in members], dtype=float)
+        node_labels = [str(getattr(node, 'label', getattr(node, 'num', ''))) for node in nodes]
+        member_labels = [str(getattr(member, 'label', getattr(member, 'memb_no', ''))) for member in members]
+        return cls(node_coords, i_index, j_index, rotation, width, height, radius, thickness, node_labels, member_labels)
+
+    def to_arrays(self) -> dict[str, np.ndarray]:
+        """
+        The model as a dict of plain arrays, labels included, e.g. for np.savez.
+        """
+        arrays = {field: getattr(self, field) for field in ARRAY_FIELDS}
+        for field in ('node_labels', 'member_labels'):
+            if getattr(self, field) is not None:
+                arrays[field] = np.array(getattr(self, field), dtype=str)
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays) -> "Model":
+        """
+        Rebuild a Model from the arrays of to_arrays, views are not kept.
+        """
+        labels = [arrays[field].tolist() if field in arrays else None for field in ('node_labels', 'member_labels')]
+        return cls(*(arrays[field] for field in ARRAY_FIELDS), *labels)
+
+    @property
+    def i_coords(self) -> np.ndarray:
+        return self.node_coords[self.i_index]
+
+    @property
+    def j_coords(self) -> np.ndarray:
+        return self.node_coords[self.j_index]
+
+    def __len__(self) -> int:
+        return self.i_index.shape[0]
+
+    @profiling.counted
+    def assign_views(self) -> dict[str, np.ndarray]:
+        """
+        Tag the members lying on the six extreme planes of the model with the spatial index,
+        see geometry.view_masks.
+
+        Returns
+        -------
+        dict[str, np.ndarray]
+            A boolean mask over the members for every view name.
+        """
+        masks = geo.view_masks(self.i_coords, self.j_coords, self.node_coords, self.spatial_index())
+        self.views[:] = 0
+        for bit, view in enumerate(geo.VIEWS):
+            self.views |= masks[view].astype(np.uint8) << bit
+        return masks
+
+    def spatial_index(self) -> spatial.SpatialIndex:
+        """
+        The spatial index of the members for plane, slab and box queries, built on first use.
+        """
+        if self._spatial_index is None:
+            self._spatial_index = spatial.SpatialIndex(self.i_coords, self.j_coords)
+        return self._spatial_index
+
+    def view_mask(self, view: str) -> np.ndarray:
+        """
+        Boolean mask of the members in a view.
+        """
+        if view == '3D':
+            return np.ones(len(self), dtype=bool)
+        return (self.views >> geo.VIEWS.index(view)) & 1 == 1
+
+    def view_masks(self) -> dict[str, np.ndarray]:
+        return {view: self.view_mask(view) for view in ('3D',) + geo.VIEWS}
+
+
+class Rows:
+    """
+    Read-only sequence of lazily created row views over a Model.
+    """
+    __slots__ = ('_model', '_view', '_count')
+
+    def __init__(self, model: Model, view: type, count: int) -> None:
+        self._model = model
+        self._view = view
+        self._count = count
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._view(self._model, k) for k in range(*index.indices(self._count))]
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("row index out of range")
+        return self._view(self._model, index)
+
+    def __iter__(self):
+        for k in range(self._count):
+            yield self._view(self._model, k)
+
+
+class NodeView:
+    """
+    A node of a Model, with the attributes of risa3d.Node.
+    """
+    __slots__ = ('_model', 'index')
+
+    def __init__(self, model: Model, index: int) -> None:
+        self._model = model
+        self.index = index
+
+    @property
+    def label(self) -> str:
+        labels = self._model.node_labels
+        return labels[self.index] if labels is not None else str(self.index + 1)
+
+    @property
+    def x(self) -> float:
+        return float(self._model.node_coords[self.index, 0])
+
+    @property
+    def y(self) -> float:
+        return float(self._model.node_coords[self.index, 1])
+
+    @property
+    def z(self) -> float:
+        return float(self._model.node_coords[self.index, 2])
+
+    def get_coordinates(self) -> list[float]:
+        return self._model.node_coords[self.index].tolist()
+
+    def __repr__(self) -> str:
+        return f"NodeView(label={self.label!r}, x={self.x}, y={self.y}, z={self.z})"
+
+
+class MemberView:
+    """
+    A member of a Model, with the geometry attributes shared by risa3d.Member and modelsmart.Member.
+    """
+    __slots__ = ('_model', 'index')
+
+    def __init__(self, model: Model, index: int) -> None:
+        self._model = model
+        self.index = index
+
+    @property
+    def label(self) -> str:
+        labels = self._model.member_labels
+        return labels[self.index] if labels is not None else str(self.index + 1)
+
+    @property
+    def inode(self) -> int:
+        return int(self._model.i_index[self.index]) + 1
+
+    @property
+    def jnode(self) -> int:
+        return int(self._model.j_index[self.index]) + 1
+
+    @property
+    def rotation(self) -> float:
+        return float(self._model.rotation[self.index])
+
+    @property
+    def width(self) -> float:
+        return float(self._model.width[self.index])
+
+    @property
+    def height(self) -> float:
+        return float(self._model.height[self.index])
+
+    @property
+    def thickness(self) -> float:
+        return float(self._model.thickness[self.index])
+
+    @property
+    def radius(self) -> float:
+        return float(self._model.radius[self.index])
+
+    @property
+    def views(self) -> list[str]:
+        bits = int(self._model.views[self.index])
+        return ['3D'] + [view for bit, view in enumerate(geo.VIEWS) if bits >> bit & 1]
+
+    def get_i_coordinates(self, nodes=None) -> list[float]:
+        return self._model.node_coords[self._model.i_index[self.index]].tolist()
+
+    def get_j_coordinates(self, nodes=None) -> list[float]:
+        return self._model.node_coords[self._model.j_index[self.index]].tolist()
+
+    def __repr__(self) -> str:
+        return (f"MemberView(label={self.label!r}, inode={self.inode}, jnode={self.jnode}, rotation={self.rotation}, "
+                f"width={self.width}, height={self.height}, radius={self.radius}, views={self.views})")
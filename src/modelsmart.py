@@ -1,6 +1,11 @@
 from dataclasses import dataclass
 import logging
 
+import numpy as np
+
+from model import Model
+import profiling
+
 class ModelSmartFile:
     def __init__(self,file_version: int,
                  num_shapes: int, 
@@ -212,55 +217,177 @@ def set_member_dimensions(members: list[Member], shapes: dict[str, Shape]) -> No
         member.height = shape.height
         member.width = shape.width
 
-def parse_file(file_name):
-    joints = []
-    members = []
+# Number of values on each joint and member record.
+JOINT_COLUMNS = 12
+MEMBER_COLUMNS = 21
+
+def parse_block(lines: list[str], first_line: int, columns: int, block: str) -> np.ndarray:
+    """
+    Parse a block of whitespace separated numeric records with one np.loadtxt call for the whole block.
+    Values past the expected columns are ignored, like the per-record parsers do.
+
+    Parameters
+    ----------
+    lines : list[str]
+        The records of the block.
+    first_line : int
+        The 1-based line number of the first record, for error messages.
+    columns : int
+        The number of values on each record.
+    block : str
+        The name of the block, for error messages.
+
+    Returns
+    -------
+    np.ndarray
+        (len(lines), columns) float array.
+
+    Raises
+    ------
+    ValueError
+        If a record is malformed, the message gives its line number.
+    """
+    if not lines:
+        return np.empty((0, columns))
+    try:
+        return np.loadtxt(lines, ndmin=2, usecols=range(columns))
+    except (ValueError, IndexError):
+        pass
+    # Find the offending record for the error message.
+    for offset, line in enumerate(lines):
+        fields = line.split()
+        try:
+            [float(field) for field in fields[:columns]]
+        except ValueError:
+            fields = None
+        if fields is None or len(fields) < columns:
+            raise ValueError(f"malformed {block} record on line {first_line + offset}: {line.strip()!r}")
+    raise ValueError(f"malformed {block} block starting on line {first_line}")
+
+@profiling.counted
+def read_blocks(file_name) -> dict:
+    """
+    Read a Modelsmart file. The header gives the size of every block so the joint and
+    member blocks are sliced out and converted in bulk, only shapes are parsed per record.
+
+    Returns
+    -------
+    dict
+        'header' (ModelSmartFile), 'joints' ((N,12) array), 'members' ((M,21) array)
+        and 'shapes' (list of Shape).
+
+    Raises
+    ------
+    ValueError
+        If a block is malformed or cut short.
+    """
+    with open(file_name, 'r') as file:
+        lines = file.read().splitlines()
+    data = lines[2].strip().split()
+    header = ModelSmartFile(lines[1].strip(), *(int(value) for value in data[:5]))
+
+    start = 3
+    blocks = {}
+    for block, count, columns in (('joints', header.num_joints, JOINT_COLUMNS),
+                                  ('members', header.num_members, MEMBER_COLUMNS)):
+        records = lines[start:start + count]
+        if len(records) != count:
+            raise ValueError(f"{block} block expects {count} records, found {len(records)}")
+        blocks[block] = parse_block(records, start + 1, columns, block)
+        start += count
+
+    # The joint load block is unused.
+    start += header.num_joints
     shapes = []
+    for _ in range(header.num_shapes):
+        shape_data = lines[start:start + 4]
+        if len(shape_data) != 4:
+            raise ValueError(f"shape record on line {start + 1} is cut short")
+        shapes.append(process_shape([line.strip() for line in shape_data]))
+        start += 4
+    return {'header': header, 'joints': blocks['joints'], 'members': blocks['members'], 'shapes': shapes}
+
+def parse_file(file_name, as_objects: bool = True):
+    """
+    Parse a Modelsmart file.
+
+    Parameters
+    ----------
+    file_name : str
+        The path of the .3dd file.
+    as_objects : bool, optional
+        Return Joint and Member instances (default), or the arrays from read_blocks.
+
+    Returns
+    -------
+    tuple[list[Joint], list[Member]] or dict or None
+        The parsed model, or None if the file could not be read.
+    """
     try:
-        with open(file_name,'r') as file:
-            file_type=file.readline().strip()
-            file_version=file.readline().strip()
-            data = file.readline().strip()
-            data = data.strip().split(" ")
-            model_file = ModelSmartFile(file_version,
-                                        int(data[0]),
-                                        int(data[1]),
-                                        int(data[2]),
-                                        int(data[3]),
-                                        int(data[4]))
-            
-            for i in range(model_file.num_joints):
-                joint = process_joint(file.readline().strip())
-                joints.append(joint)
-
-            for i in range(model_file.num_members):
-                member = process_member(file.readline().strip())
-                members.append(member)
-
-            #this data is unused skips joint load data
-            for i in range(model_file.num_joints):
-                file.readline()
-
-            for i in range(model_file.num_shapes):
-                shape_data = []
-                shape_data.append(file.readline().strip())
-                shape_data.append(file.readline().strip())
-                shape_data.append(file.readline().strip())
-                shape_data.append(file.readline().strip())
-                shape = process_shape(shape_data)
-                shapes.append(shape)
+        data = read_blocks(file_name)
     except FileNotFoundError:
         logging.error("File not found")
         return
     except PermissionError:
         logging.error("Permission denied, could not read file")
         return
+    except (ValueError, IndexError) as e:
+        logging.error(f"Could not parse {file_name}, {e}")
+        return
     except Exception as e:
         logging.error("An unknown error occurred")
         return
 
-    set_member_dimensions(members, shapes)
-
     logging.info("modelsmart file parsed")
+    if not as_objects:
+        return data
+    return to_objects(data)
+
+@profiling.counted
+def to_objects(data: dict) -> tuple[list[Joint], list[Member]]:
+    """
+    Build the Joint and Member instances of the arrays returned by read_blocks.
+    """
+    joints = [Joint(int(row[0]), *row[1:4], *(int(value) for value in row[4:])) for row in data['joints'].tolist()]
+
+    members = []
+    for row in data['members'].tolist():
+        members.append(Member(int(row[0]), int(row[1]), int(row[2]), row[3], row[4], int(row[5]), int(row[6]),
+                              row[7], row[8], int(row[9]), int(row[10]), int(row[11]), row[12],
+                              *(bool(value) for value in row[13:18]), *row[18:21]))
+    set_member_dimensions(members, data['shapes'])
     return joints, members
-        
\ No newline at end of file
+
+@profiling.counted
+def to_model(data: dict) -> Model:
+    """
+    Build the columnar Model of the arrays returned by read_blocks.
+    Members take the height and width of their shape and reference joints by position.
+    """
+    joints = data['joints']
+    members = data['members']
+    shapes = data['shapes']
+    dimensions = np.array([(shape.height, shape.width) for shape in shapes], dtype=float).reshape(-1, 2)
+    shape_index = members[:, 9].astype(np.int64) - 1
+    if members.shape[0] and shapes:
+        height, width = dimensions[shape_index].T
+    else:
+        height = width = np.zeros(members.shape[0])
+    return Model(joints[:, 1:4], members[:, 1].astype(np.int64) - 1, members[:, 2].astype(np.int64) - 1,
+                 members[:, 12], width, height, np.zeros(members.shape[0]),
+                 node_labels=[str(num) for num in joints[:, 0].astype(np.int64).tolist()],
+                 member_labels=[str(num) for num in members[:, 0].astype(np.int64).tolist()])
+
+def read_model(file_name) -> Model:
+    """
+    Parse a Modelsmart file into a Model.
+
+    Returns
+    -------
+    Model or None
+        The parsed model, or None if the file could not be read.
+    """
+    data = parse_file(file_name, as_objects=False)
+    if data is None:
+        return None
+    return to_model(data)
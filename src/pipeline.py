@@ -0,0 +1,620 @@
+import numpy as np
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import Union, List
+
+import cache
+import exporters as exp
+import geometry as geo
+import incremental
+import metrics
+import profiling
+import modelsmart as ms
+import risa3d as r3d
+import sections as sec
+from model import Model
+
+LOGGING_LEVEL = logging.DEBUG
+LOG_FILE = "convert.log"
+LOG_FORMAT = "%(asctime)s | %(levelname)s | %(message)s"
+LOG_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+# Bounds of the number of cylinder sides in adaptive mode.
+CYL_MIN = 6
+CYL_MAX = 64
+# Views written at the same time by export_views.
+EXPORT_THREADS = 4
+
+def setup_logging(log_file: str = LOG_FILE, level: int = LOGGING_LEVEL) -> None:
+    if log_file is None:
+        logging.basicConfig(level=level, format=LOG_FORMAT, datefmt=LOG_DATE_FORMAT)
+        return
+    # Check if the log file can be created or written to
+    try:
+        # Attempt to open the file in append mode
+        with open(log_file, 'a'):
+            pass  # If this succeeds, the file is writable
+    except (IOError, OSError):
+        print(f"Error: Cannot write to log file '{log_file}'. Falling back to console logging.")
+        logging.basicConfig(level=level, format=LOG_FORMAT, datefmt=LOG_DATE_FORMAT)
+    else:
+        # If writable, proceed with file logging
+        logging.basicConfig(level=level, format=LOG_FORMAT, datefmt=LOG_DATE_FORMAT, filename=log_file)
+
+def create_folder(dest_dir, filename, subs_flag):
+    """
+    Create a folder to store the generated OBJ files.
+    
+    Parameters
+    ----------
+    dest_dir : str
+        The destination directory.
+    filename : str
+        The name of the file.
+    subs_flag : bool
+        Flag to create subfolders for each file.
+
+    Returns
+    -------
+    str
+        The path to the folder where the OBJ files will be stored.
+    """
+    new_folder = os.path.join(dest_dir, filename)
+
+    logging.info(f"Verifying {dest_dir} exists...")
+    if os.path.exists(dest_dir):
+        logging.info(f"{dest_dir} is exists. Checking writability...")
+        if os.access(dest_dir, os.W_OK):
+            logging.info(f"{dest_dir} is writable.")
+            if subs_flag and not os.path.exists(new_folder):
+                logging.info(f"Creating subfolder {new_folder}...")
+                if not os.path.exists(new_folder):
+                    os.mkdir(new_folder)
+                    if os.path.exists(new_folder):
+                        logging.info(f"{new_folder} successfully created.")
+                        return new_folder
+                    else:
+                        logging.error("Subfolder creation failed.")
+                        logging.error(f"Reverting to {dest_dir}.")
+                        return os.getcwd()
+            elif subs_flag:
+                return new_folder
+            else:
+                return dest_dir
+        else:
+            logging.error(f"{dest_dir} is not writable. Reverting back to current working directory.")
+            return os.getcwd()
+    else:
+        logging.error(f"{dest_dir} does not exist. Reverting back to current working directory.")
+        return os.getcwd()
+
+def export_threads(options, views: int, recorder: metrics.Recorder = None) -> int:
+    """
+    The number of threads writing views: options["ExportThreads"], by default EXPORT_THREADS,
+    at most one per view. Memory tracing measures one stage at a time, so it writes them one by one.
+    """
+    if recorder is not None and recorder.trace_memory:
+        return 1
+    return max(min(int(options.get("ExportThreads") or EXPORT_THREADS), views), 1)
+
+def _write_view(writer, out_path, vertices, faces, decimals, view_name, recorder) -> None:
+    with metrics.stage(recorder, "export", view_name):
+        writer(out_path, vertices, faces, decimals)
+
+@profiling.counted
+def export_views(generated_views, srcfilename, options, recorder: metrics.Recorder = None):
+    """
+    Export the generated views to files in the format selected by options["Format"] (default OBJ).
+    The views are written concurrently by a pool of export_threads threads, a view that fails
+    is reported and does not stop the others.
+
+    Parameters
+    ----------
+    generated_views : list
+        A list of the generated views.
+    srcfilename : str
+        The name of the source file.
+    options : dict 
+        The conversion options.
+    recorder : metrics.Recorder, optional
+        Collects the write time and size of every view, and the error of a view that failed.
+
+    Returns
+    -------
+    list[str]
+        The names of the files written, without extension, in the order of generated_views.
+    """
+    extension = options.get("Format", "obj")
+    writer = exp.EXPORTERS[extension]
+    folder = create_folder(options["Dest"], srcfilename, options["Subs"])
+    decimals = int(options["Prec"])
+    jobs = []
+    for view in generated_views:
+        if len(view) > 2:
+            filename = view[2]
+            out_path = os.path.join(folder, filename + "." + extension)
+            jobs.append((filename, out_path, view[0], view[1], filename[len(srcfilename) + 1:]))
+        else:
+            logging.error(f"{view[0]}{view[1]}.")
+
+    threads = export_threads(options, len(jobs), recorder)
+    written = []
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        futures = []
+        for filename, out_path, vertices, faces, view_name in jobs:
+            logging.info(f"Writing {filename}.{extension}")
+            futures.append(pool.submit(_write_view, writer, out_path, vertices, faces, decimals, view_name, recorder))
+
+        for (filename, out_path, _, _, view_name), future in zip(jobs, futures):
+            try:
+                future.result()
+            except Exception as e:
+                logging.error(f"Error creating {filename}: {e}")
+                if recorder is not None:
+                    recorder.count(view_name, error=str(e))
+                continue
+            if os.path.exists(out_path):
+                logging.info(f"File {filename} successfully created.")
+                written.append(filename)
+                if recorder is not None:
+                    recorder.count(view_name, bytes_written=os.path.getsize(out_path))
+            else:
+                logging.error(f"Error creating {filename}.")
+    return written
+
+def export_views_to_obj(generated_views, srcfilename, options):
+    """
+    Export the generated views to OBJ files.
+
+    Parameters
+    ----------
+    generated_views : list
+        A list of the generated views.
+    srcfilename : str
+        The name of the source file.
+    options : dict 
+        The conversion options.
+
+    Returns
+    -------
+    list[str]
+        The names of the files written, without extension.
+    """
+    return export_views(generated_views, srcfilename, {**options, "Format": "obj"})
+
+@profiling.counted
+def gen_view(members, nodes, filename, view, options, geometry=None, masks=None):
+    # this technially "works" with modelsmart files but
+    # needs to be fixed so that it is really modular
+    logging.info(f"Generating {view} view")
+    if geometry is None:
+        geometry = build_geometry(Model.from_objects(nodes, members), options)
+    if masks is not None:
+        selection = masks[view]
+    else:
+        selection = np.array([view in member.views for member in members], dtype=bool)
+    all_vertices, all_faces = geometry.select(selection)
+    if options.get("Weld"):
+        vertex_count = len(all_vertices)
+        all_vertices, all_faces = geo.weld(all_vertices, all_faces)
+        logging.info(f"Welded {view} view from {vertex_count} to {len(all_vertices)} vertices")
+
+    if len(all_vertices) == 0:
+        logging.error("No members found for gen_view")
+        return_arr = ["No members found for ", filename + '_' + view]
+        return return_arr
+    return all_vertices, all_faces, filename + '_' + view
+
+@profiling.counted
+def build_geometry(model: Model, options, recorder: metrics.Recorder = None) -> geo.ModelGeometry:
+    """
+    Generate the rounded geometry of every member once so it can be shared by all views.
+    With options["CheckWinding"] the member meshes are checked before rounding, see
+    geometry.ModelGeometry.check_winding.
+
+    Parameters
+    ----------
+    model : Model
+        The parsed model.
+    options : dict
+        The conversion options.
+    recorder : metrics.Recorder, optional
+        Times the geometry and rounding stages.
+
+    Returns
+    -------
+    geometry.ModelGeometry
+        The cached member geometry.
+    """
+    logging.info("Generating member geometry")
+    with metrics.stage(recorder, "geometry"):
+        geometry = geo.ModelGeometry(model.i_coords, model.j_coords, model.rotation, model.width, model.height,
+                                     model.radius, circle_sizes(model, options))
+    if options.get("CheckWinding"):
+        geometry.check_winding()
+    with metrics.stage(recorder, "rounding"):
+        geometry.round(int(options["Prec"]))
+    return geometry
+
+def circle_sizes(model: Model, options):
+    """
+    The number of sides of the cylinders: options["Cyl"], or per member when options["CylTol"] is set.
+    With a tolerance each cylinder gets the fewest sides keeping its chordal error under CylTol
+    times the model's bounding box diagonal, clamped to "CylMin" and "CylMax".
+
+    Parameters
+    ----------
+    model : Model
+        The parsed model.
+    options : dict
+        The conversion options.
+
+    Returns
+    -------
+    int or np.ndarray
+        The number of sides, or a (M,) array of them per member.
+    """
+    tolerance = float(options.get("CylTol") or 0)
+    if tolerance <= 0:
+        return int(options["Cyl"])
+    min_size = int(options.get("CylMin") or CYL_MIN)
+    max_size = int(options.get("CylMax") or CYL_MAX)
+    # The ring of a cylinder has half the member's radius value, see geometry.circ_vertices.
+    sizes = geo.adaptive_circle_sizes(model.radius / 2, tolerance * geo.model_size(model.node_coords), min_size, max_size)
+    if model.radius.any():
+        logging.info(f"Adaptive cylinders use {sizes[model.radius != 0].min()} to {sizes[model.radius != 0].max()} sides")
+    return sizes
+
+def selected_views(options) -> list[str]:
+    """
+    List the views requested by the options, in the order they are generated.
+
+    Parameters
+    ----------
+    options : dict
+        The conversion options. "Dim" is '2D', '3D', 'All' or 'None' and the
+        "YZ", "XZ" and "XY" flags select the 2D projections. The section views
+        of "Sections" come after these, see sections.parse_sections.
+
+    Returns
+    -------
+    list[str]
+        The view names.
+    """
+    views = []
+    if options["Dim"] in ('3D', 'All'):
+        views.append('3D')
+    if options["Dim"] in ('2D', 'All'):
+        for plane in ('YZ', 'XZ', 'XY'):
+            if options[plane]:
+                views.extend([plane + '_1', plane + '_2'])
+    return views
+
+@profiling.counted
+def generate_views(model: Model, filename, options, masks=None, views=None, recorder: metrics.Recorder = None):
+    """
+    Generate the views of a model.
+
+    Parameters
+    ----------
+    model : Model
+        The parsed model, see Model.from_objects for lists of nodes and members.
+    filename : str
+        The name of the file.
+    options : dict
+        The conversion options, see selected_views.
+    masks : dict[str, np.ndarray], optional
+        The view masks, by default the ones stored in the model's views bitmask.
+    views : list[str], optional
+        The views to generate, by default selected_views(options).
+    recorder : metrics.Recorder, optional
+        Collects the time and size of every stage and view.
+
+    Returns
+    -------
+    list
+        A list of the generated views.
+    """
+    if views is None:
+        views = selected_views(options)
+    if not views:
+        return []
+    geometry = build_geometry(model, options, recorder)
+    if masks is None:
+        masks = model.view_masks()
+    generated = []
+    for view in views:
+        with metrics.stage(recorder, "generate", view):
+            generated.append(gen_view(model.members, model.nodes, filename, view, options, geometry, masks))
+        if recorder is not None:
+            vertices, faces = (generated[-1][0], generated[-1][1]) if len(generated[-1]) > 2 else ([], [])
+            recorder.count(view, members=int(np.count_nonzero(masks[view])), vertices=len(vertices),
+                           faces=sum(len(block) for block in faces))
+    if recorder is not None:
+        recorder.count(geometry_vertices=len(geometry.vertices))
+    return generated
+
+@profiling.counted
+def stream_views(model: Model, filename, options, masks=None, views=None, recorder: metrics.Recorder = None) -> list[str]:
+    """
+    Generate and write the views of a model options["Chunk"] members at a time, see geometry.iter_chunks.
+    Each batch is rounded and handed to the writer of options["Format"] straight away, so only
+    one batch of geometry is in memory whatever the size of the model.
+
+    Parameters
+    ----------
+    model : Model
+        The parsed model.
+    filename : str
+        The name of the file.
+    options : dict
+        The conversion options, see selected_views and export_views.
+    masks : dict[str, np.ndarray], optional
+        The view masks, by default the ones stored in the model's views bitmask.
+    views : list[str], optional
+        The views to write, by default selected_views(options).
+    recorder : metrics.Recorder, optional
+        Collects the time and size of every view.
+
+    Returns
+    -------
+    list[str]
+        The names of the files written, without extension.
+    """
+    if views is None:
+        views = selected_views(options)
+    if not views:
+        return []
+    if masks is None:
+        masks = model.view_masks()
+    extension = options.get("Format", "obj")
+    stream = exp.STREAMS[extension]
+    folder = create_folder(options["Dest"], filename, options["Subs"])
+    decimals = int(options["Prec"])
+    chunk_size = max(int(options["Chunk"]), 1)
+    i_coords, j_coords = model.i_coords, model.j_coords
+    sizes = circle_sizes(model, options)
+    # Zero length members are left out of every view, see geometry.ModelGeometry.
+    valid = ~np.all(i_coords == j_coords, axis=1)
+    if not valid.all():
+        logging.error(f"Direction vector has zero length for {np.count_nonzero(~valid)} member(s), skipping.")
+
+    written = []
+    for view in views:
+        name = filename + '_' + view
+        members = np.flatnonzero(masks[view] & valid)
+        if len(members) == 0:
+            logging.error(f"No members found for {name}.")
+            continue
+        logging.info(f"Writing {name}.{extension} in batches of {chunk_size} members")
+        out_path = os.path.join(folder, name + "." + extension)
+        vertex_count = face_count = 0
+        with metrics.stage(recorder, "export", view):
+            with stream(out_path, decimals) as output:
+                for vertices, faces in geo.iter_chunks(i_coords, j_coords, model.rotation, model.width, model.height,
+                                                       model.radius, sizes, members, chunk_size, decimals):
+                    output.write(vertices, faces)
+                    vertex_count += len(vertices)
+                    face_count += sum(len(block) for block in faces)
+
+        if os.path.exists(out_path):
+            logging.info(f"File {name} successfully created.")
+            written.append(name)
+            if recorder is not None:
+                recorder.count(view, members=len(members), vertices=vertex_count, faces=face_count,
+                               bytes_written=os.path.getsize(out_path))
+        else:
+            logging.error(f"Error creating {name}.")
+    return written
+
+@profiling.counted
+def parse_model(filepath) -> Union[Model, None]:
+    """
+    Parse a RISA-3D (.r3d) or Modelsmart (.3dd) file.
+
+    Parameters
+    ----------
+    filepath : str
+        The path of the file.
+
+    Returns
+    -------
+    Model or None
+        The parsed model, or None if the file could not be parsed.
+    """
+    extension = os.path.splitext(filepath)[1].lower()
+    if extension == ".r3d":
+        return r3d.read_model(filepath)
+    elif extension == ".3dd":
+        return ms.read_model(filepath)
+    logging.error("invalid file type")
+    return None
+
+@profiling.counted
+def read_model(filepath, cache_dir: str = None, cache_size: int = cache.CACHE_SIZE) -> Union[Model, None]:
+    """
+    Parse a RISA-3D (.r3d) or Modelsmart (.3dd) file, going through the parse cache if one is given.
+
+    Parameters
+    ----------
+    filepath : str
+        The path of the file.
+    cache_dir : str, optional
+        The parse cache directory, by default files are always parsed.
+    cache_size : int, optional
+        The size limit of the parse cache in bytes.
+
+    Returns
+    -------
+    Model or None
+        The parsed model, or None if the file could not be parsed.
+    """
+    if cache_dir and os.path.splitext(filepath)[1].lower() in (".r3d", ".3dd"):
+        return cache.cached_model(filepath, parse_model, cache_dir, cache_size)
+    return parse_model(filepath)
+
+@profiling.counted
+def convert_file(filepath, options) -> bool:
+    """
+    Convert a single file to OBJ, STL or GLB.
+
+    Parameters
+    ----------
+    filepath : str
+        The path of the .r3d or .3dd file.
+    options : dict
+        The conversion options: "Dest", "Dim", "YZ", "XZ", "XY", "Cyl", "Prec" and "Subs",
+        and optionally:
+        "Format" ('obj', 'stl' or 'glb'),
+        "Weld" (merge duplicate vertices),
+        "CylTol", "CylMin" and "CylMax" (adaptive cylinders, see circle_sizes),
+        "Cache" (parse cache directory),
+        "CacheSize" (its size limit in bytes),
+        "Incremental" (only rewrite the views whose members or options changed since the last run),
+        "Metrics" (JSON-lines file the per-stage and per-view metrics are appended to),
+        "MetricsMemory" (also trace the peak memory of each stage),
+        "CountCalls" (log the calls and time of every pipeline function),
+        "Chunk" (members per batch, streams the views to their files, see stream_views),
+        "ExportThreads" (views written at the same time, see export_views),
+        "CheckWinding" (check that every member mesh is wound outwards, see build_geometry),
+        "Sections" (extra plane and slab views, see sections.parse_section).
+
+    Returns
+    -------
+    bool
+        True if the file was converted.
+    """
+    logging.info("Conveting file: " + filepath)
+    recorder = metrics.Recorder(options.get("Metrics"), filepath, bool(options.get("MetricsMemory")))
+    counting = options.get("CountCalls") and not profiling.enabled()
+    if counting:
+        profiling.reset()
+        profiling.enable()
+    converted = False
+    try:
+        converted = _convert_model(filepath, options, recorder)
+    finally:
+        recorder.close(converted)
+        if counting:
+            profiling.disable()
+            logging.info(f"Calls and time per function for {filepath}:\n{profiling.report()}")
+    return converted
+
+def _convert_model(filepath, options, recorder: metrics.Recorder) -> bool:
+    if not os.path.exists(filepath):
+        logging.error(f"File not found: {filepath}")
+        return False
+    try:
+        sections = sec.parse_sections(options.get("Sections"))
+    except ValueError as e:
+        logging.error(str(e))
+        return False
+
+    filename = os.path.splitext(os.path.basename(filepath))[0]
+    with recorder.stage("parse"):
+        model = read_model(filepath, options.get("Cache"), options.get("CacheSize") or cache.CACHE_SIZE)
+    if model is None:
+        return False
+    recorder.count(members=len(model), nodes=len(model.nodes), file_bytes=os.path.getsize(filepath))
+    with recorder.stage("assign_views"):
+        masks = model.assign_views()
+        masks.update(sec.section_masks(model, sections))
+
+    views = selected_views(options) + [section.name for section in sections]
+    if options.get("Incremental"):
+        with recorder.stage("fingerprint"):
+            folder = create_folder(options["Dest"], filename, options["Subs"])
+            extension = options.get("Format", "obj")
+            fingerprints = incremental.view_fingerprints(model, masks, views, options)
+            stored = incremental.load(folder, filename)
+            views = incremental.changed_views(views, fingerprints, stored,
+                                              lambda view: os.path.join(folder, f"{filename}_{view}.{extension}"))
+        logging.info(f"{len(views)} of {len(fingerprints)} views changed since the last export")
+
+    if options.get("Chunk") and not options.get("Weld"):
+        logging.info("Starting streamed write process...")
+        with recorder.stage("export"):
+            written = stream_views(model, filename, options, masks, views, recorder)
+    else:
+        if options.get("Chunk"):
+            logging.info("Welding needs whole views, generating them in memory")
+        generated_views = generate_views(model, filename, options, masks, views, recorder)
+
+        logging.info("Starting write process...")
+        with recorder.stage("export"):
+            written = export_views(generated_views, filename, options, recorder)
+    recorder.count(views_written=len(written),
+                   bytes_written=sum(values.get("bytes_written", 0) for values in recorder.views.values()))
+    # Every run that exports views keeps the manifest in step with the files, see incremental.
+    if options.get("Incremental"):
+        written_views = [view for view in views if f"{filename}_{view}" in written]
+        valid = ~np.all(model.i_coords == model.j_coords, axis=1)
+        empty_views = [view for view in views if not (masks[view] & valid).any()]
+        incremental.update(stored, views, fingerprints, written_views, empty_views)
+        incremental.save(folder, filename, stored)
+    elif views:
+        incremental.forget(create_folder(options["Dest"], filename, options["Subs"]), filename, views)
+    logging.info("File successfully converted")
+    return True
+
+def _convert_file_safe(filepath, options) -> bool:
+    # Runs in the worker processes, an exception must only fail its own file.
+    try:
+        return convert_file(filepath, options)
+    except Exception:
+        logging.exception(f"Conversion of {filepath} failed")
+        return False
+
+def current_log_file() -> Union[str, None]:
+    """
+    The file the root logger writes to, or None when it logs to the console.
+    Worker processes pass it to setup_logging to log where their parent does.
+    """
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, logging.FileHandler):
+            return handler.baseFilename
+    return None
+
+def convert_files(filepaths: List[str], options, workers: int = None) -> dict[str, bool]:
+    """
+    Convert a batch of files, fanning them out to a process pool.
+    A file that fails is reported and does not stop the rest of the batch.
+
+    Parameters
+    ----------
+    filepaths : List[str]
+        The paths of the .r3d or .3dd files.
+    options : dict
+        The conversion options, see convert_file.
+    workers : int, optional
+        Number of worker processes, by default one per CPU. 1 converts in this process.
+
+    Returns
+    -------
+    dict[str, bool]
+        Whether each file was converted, in the order of filepaths.
+    """
+    workers = min(workers or os.cpu_count() or 1, max(len(filepaths), 1))
+    results = dict.fromkeys(filepaths, False)
+    if workers == 1:
+        for filepath in results:
+            results[filepath] = _convert_file_safe(filepath, options)
+    else:
+        # Start the biggest files first so one large model does not finish the batch alone.
+        ordered = sorted(results, key=lambda path: os.path.getsize(path) if os.path.exists(path) else 0, reverse=True)
+        root = logging.getLogger()
+        with ProcessPoolExecutor(max_workers=workers, initializer=setup_logging, initargs=(current_log_file(), root.level)) as pool:
+            futures = {pool.submit(_convert_file_safe, filepath, options): filepath for filepath in ordered}
+            for future in as_completed(futures):
+                filepath = futures[future]
+                try:
+                    results[filepath] = future.result()
+                except Exception as e:
+                    logging.error(f"Conversion of {filepath} failed: {e}")
+
+    for filepath, converted in results.items():
+        if converted:
+            logging.info(f"Converted {filepath}")
+        else:
+            logging.error(f"Failed to convert {filepath}")
+    return results
@@ -0,0 +1,96 @@
+"""
+Profiling helpers: a cProfile wrapper for whole runs and a lightweight call counter
+for the pipeline functions decorated with counted.
+"""
+import cProfile
+import functools
+import io
+import logging
+import os
+import pstats
+import threading
+import time
+
+# Calls and total seconds per function name, filled while counting is enabled.
+COUNTERS = {}
+_enabled = False
+_lock = threading.Lock()
+
+def enable() -> None:
+    global _enabled
+    _enabled = True
+
+def disable() -> None:
+    global _enabled
+    _enabled = False
+
+def enabled() -> bool:
+    return _enabled
+
+def reset() -> None:
+    COUNTERS.clear()
+
+def counted(function):
+    """
+    Count the calls and wall time of a function while counting is enabled.
+    When it is disabled the only overhead is one flag check per call.
+    """
+    name = f"{function.__module__}.{function.__qualname__}"
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if not _enabled:
+            return function(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            seconds = time.perf_counter() - start
+            # Views are exported from several threads.
+            with _lock:
+                counter = COUNTERS.setdefault(name, [0, 0.0])
+                counter[0] += 1
+                counter[1] += seconds
+    return wrapper
+
+def report() -> str:
+    """
+    The counters as a table, slowest function first.
+    Nested functions are included in their callers' time.
+    """
+    lines = [f"{'calls':>8} {'seconds':>10}  function"]
+    for name, (calls, seconds) in sorted(COUNTERS.items(), key=lambda item: item[1][1], reverse=True):
+        lines.append(f"{calls:>8} {seconds:>10.4f}  {name}")
+    return "\n".join(lines)
+
+def profile_call(path: str, top: int, function, *args, **kwargs):
+    """
+    Run a function under cProfile, writing the raw statistics to path.prof and the
+    top functions by cumulative time to path.txt.
+
+    Parameters
+    ----------
+    path : str
+        The output path without extension.
+    top : int
+        Number of functions listed in the summary.
+    function : callable
+        The function to profile, called with the remaining arguments.
+
+    Returns
+    -------
+    The result of the function.
+    """
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(function, *args, **kwargs)
+    finally:
+        try:
+            profiler.dump_stats(path + ".prof")
+            summary = io.StringIO()
+            pstats.Stats(profiler, stream=summary).sort_stats(pstats.SortKey.CUMULATIVE).print_stats(top)
+            with open(path + ".txt", "w") as summary_file:
+                summary_file.write(summary.getvalue())
+            logging.info(f"Profile written to {os.path.abspath(path)}.prof and .txt")
+        except OSError as e:
+            logging.error(f"Could not write the profile {path}: {e}")
@@ -1,5 +1,14 @@
 from dataclasses import dataclass
+from typing import Union
+import io
 import logging
+import mmap
+import os
+
+import numpy as np
+
+from model import Model
+import profiling
 
 
 HEADINGS = ['UNITS', 'NODES','.MEMBERS_MAIN_DATA','SHAPES_LIST']
@@ -30,6 +39,25 @@ class Shape:
 def clean_dimension_input(dimension):
     return ''.join(char for char in dimension if char.isdigit() or char == '.' or char == '-')
 
+def dimensions_from_label(shape_label: str, member_label: str = '') -> tuple[float, float, float, float]:
+    """
+    Read the dimensions encoded in a shape label such as HSS4X4X4 or PIPE4X0.25.
+
+    Returns
+    -------
+    tuple[float, float, float, float]
+        The height, width, thickness and radius, zero where the label has none.
+    """
+    dimensions = shape_label.upper().split('X')
+    if len(dimensions) == 2:
+        return 0, 0, 0, float(clean_dimension_input(dimensions[0]))
+    elif len(dimensions) == 3:
+        return (float(clean_dimension_input(dimensions[0])),
+                float(clean_dimension_input(dimensions[1])),
+                float(clean_dimension_input(dimensions[2])), 0)
+    logging.warning(f"Dimesions not found for member: {member_label}, shape: {shape_label}")
+    return 0, 0, 0, 0
+
 @dataclass
 class Member:
     label: str
@@ -52,15 +80,11 @@ class Member:
     theta_xy: float = 0
 
     def __post_init__(self) -> None:
-        dimensions = self.shape_label.upper().split('X')
-        if len(dimensions) == 2:
-            self.radius = float(clean_dimension_input(dimensions[0]))
-        elif len(dimensions) == 3:
-            self.height = float(clean_dimension_input(dimensions[0]))
-            self.width = float(clean_dimension_input(dimensions[1]))
-            self.thickness = float(clean_dimension_input(dimensions[2]))
-        else:
-            logging.warning(f"Dimesions not found for member: {self.label}, shape: {self.shape_label}")
+        height, width, thickness, radius = dimensions_from_label(self.shape_label, self.label)
+        if radius:
+            self.radius = radius
+        elif height or width or thickness:
+            self.height, self.width, self.thickness = height, width, thickness
     
     def get_i_coordinates(self,nodes) -> list[float]:
         x,y,z = nodes[self.inode-1].get_coordinates()
@@ -197,46 +221,357 @@ def set_member_dimensions(members: list[Member], shapes: dict[str, Shape]) -> No
             logging.error(f"Shape not found: {member.shape_label}")
 
 
-def parse_file(filename):
-    nodes = []
-    members = []
-    shapes = []
+class ParseError(Exception):
+    """A malformed record, with the line number it was found on."""
+    def __init__(self, message: str, line_number: int) -> None:
+        super().__init__(f"line {line_number}: {message}")
+        self.message = message
+        self.line_number = line_number
+
+def section_header(line: str) -> Union[tuple[str, int], None]:
+    """
+    Recognise the header of one of the HEADINGS sections, e.g. "[NODES] <12>".
+
+    Returns
+    -------
+    tuple[str, int] or None
+        The heading and its number of records, or None if the line is not such a header.
+    """
+    if not line.startswith('['):
+        return None
+    end = line.find(']')
+    heading = line[1:end]
+    if heading not in HEADINGS:
+        return None
+    return heading, int(line[end + 1:].strip().strip('<>'))
+
+def _quoted_fields(line: str, count: int, line_number: int, section: str) -> tuple[list[str], list[str]]:
+    # Records are: "field" "field" ... numbers;
+    parts = line.split('"', 2 * count)
+    if len(parts) != 2 * count + 1:
+        raise ParseError(f"Malformed {section} record: {line.strip()}", line_number)
+    return [parts[k].strip() for k in range(1, 2 * count, 2)], parts[-1].strip().rstrip(';').split()
+
+@profiling.counted
+def parse_records(lines: list[str], first_line: int, section: str, quoted: int, columns: tuple[int, ...]) -> tuple[list[list[str]], np.ndarray]:
+    """
+    Parse the records of a section, each made of quoted fields followed by numbers and a ';'.
+    The whole section is tokenized at once: one split on quotes for the quoted fields and
+    one np.loadtxt call for the numbers. Only if that fails are the records parsed one at a
+    time, to find the line number of the malformed record.
+
+    Parameters
+    ----------
+    lines : list[str]
+        The records.
+    first_line : int
+        Line number of the first record in the file.
+    section : str
+        The section heading, for error messages.
+    quoted : int
+        Number of quoted fields at the start of each record.
+    columns : tuple[int, ...]
+        Positions of the numbers to keep, counted from the first number of the record.
+
+    Returns
+    -------
+    tuple[list[list[str]], np.ndarray]
+        A list per quoted field and a (N, len(columns)) array of the numbers.
+
+    Raises
+    ------
+    ParseError
+        If a record is malformed.
+    """
+    if not lines:
+        return [[] for _ in range(quoted)], np.empty((0, len(columns)))
+
+    stride = 2 * quoted
+    parts = ''.join(lines).split('"')
+    if (len(parts) == stride * len(lines) + 1 and not parts[0].strip()
+            and all(not separator.strip() for k in range(2, stride, 2) for separator in set(parts[k::stride]))):
+        try:
+            values = np.loadtxt(io.StringIO(''.join(parts[stride::stride])), comments=';', usecols=columns, ndmin=2)
+        except ValueError:
+            values = None
+        if values is not None and values.shape[0] == len(lines):
+            return [list(map(str.strip, parts[k::stride])) for k in range(1, stride, 2)], values
+
+    fields = [[] for _ in range(quoted)]
+    values = np.empty((len(lines), len(columns)))
+    for k, line in enumerate(lines):
+        quoted_fields, numbers = _quoted_fields(line, quoted, first_line + k, section)
+        try:
+            values[k] = [float(numbers[column]) for column in columns]
+        except (ValueError, IndexError):
+            raise ParseError(f"Malformed {section} record: {line.strip()}", first_line + k) from None
+        for field, value in zip(fields, quoted_fields):
+            field.append(value)
+    return fields, values
+
+def parse_nodes(lines: list[str], first_line: int) -> tuple[list[str], np.ndarray]:
+    """
+    Parse NODES records into the node labels and an (N,3) coordinate array.
+    """
+    (labels,), coords = parse_records(lines, first_line, 'NODES', 1, (0, 1, 2))
+    return labels, coords
+
+# Numeric columns of a .MEMBERS_MAIN_DATA record that are kept, and their position in the record.
+MEMBER_COLUMNS = {'inode': 0, 'jnode': 1, 'knode': 2, 'rotation': 3, 'offset': 4, 'material': 7}
+
+def parse_members(lines: list[str], first_line: int) -> dict:
+    """
+    Parse .MEMBERS_MAIN_DATA records into label lists and one array per MEMBER_COLUMNS entry.
+    """
+    (labels, design_lists, shape_labels), values = parse_records(lines, first_line, '.MEMBERS_MAIN_DATA', 3,
+                                                                  tuple(MEMBER_COLUMNS.values()))
+    members = {'label': labels, 'design_list': design_lists, 'shape_label': shape_labels}
+    for column, values_column in zip(MEMBER_COLUMNS, values.T):
+        members[column] = values_column if column == 'rotation' else values_column.astype(np.int64)
+    return members
+
+def parse_shapes(lines: list[str], first_line: int) -> dict[str, Shape]:
+    """
+    Parse SHAPES_LIST records into a Shape per shape name, like get_shapes_list.
+    Shapes without a width are round and their first dimension is the radius.
+    """
+    shapes = {}
+    (names,), values = parse_records(lines, first_line, 'SHAPES_LIST', 1, (4, 5, 6))
+    for name, (height, thickness, width) in zip(names, values.tolist()):
+        if width != 0:
+            shapes[name] = Shape(name, height, thickness, width)
+        else:
+            shapes[name] = Shape(name, float(0), thickness, width, height)
+    return shapes
+
+@profiling.counted
+def member_dimensions(members: dict, shapes: dict[str, Shape]) -> None:
+    """
+    Add the height, width, thickness and radius arrays to the parsed members.
+    Shapes missing from the SHAPES_LIST fall back to the dimensions in their label.
+    Each distinct shape label is resolved once.
+    """
+    codes = {}
+    inverse = np.fromiter((codes.setdefault(label, len(codes)) for label in members['shape_label']),
+                          dtype=np.int64, count=len(members['shape_label']))
+    dimensions = np.zeros((len(codes), 4))
+    for k, shape_label in enumerate(codes):
+        if shape_label in shapes:
+            shape = shapes[shape_label]
+            dimensions[k] = shape.height, shape.width, shape.thickness, shape.radius
+        else:
+            logging.error(f"Shape not found: {shape_label}")
+            dimensions[k] = dimensions_from_label(shape_label)
+    dimensions = dimensions[inverse] if len(codes) else np.zeros((0, 4))
+    for column, values in zip(('height', 'width', 'thickness', 'radius'), dimensions.T):
+        members[column] = values
+
+# Bytes scanned per step when looking for section headers or counting lines, a multiple of the page size.
+SCAN_WINDOW = 1 << 24
+
+def _release(buffer, start: int, end: int) -> None:
+    # Drop the scanned pages of a mapped file from the resident set, they are re-read if needed again.
+    advice = getattr(mmap, 'MADV_DONTNEED', None)
+    if advice is not None and hasattr(buffer, 'madvise'):
+        start -= start % mmap.PAGESIZE
+        buffer.madvise(advice, start, end - start)
+
+@profiling.counted
+def scan_sections(buffer, headings=HEADINGS) -> dict[str, tuple[int, int, int, int]]:
+    """
+    Find the byte offsets of the HEADINGS sections in a mapped RISA-3D file without decoding it.
+    Every line starting with '[' is a section header and a section runs up to the next one.
+    The file is scanned a window at a time and scanned pages are released, so the resident
+    memory does not grow with the file size.
+
+    Parameters
+    ----------
+    buffer : mmap.mmap or bytes
+        The file contents.
+    headings : iterable of str, optional
+        The sections to look for, by default all HEADINGS.
+
+    Returns
+    -------
+    dict[str, tuple[int, int, int, int]]
+        Per heading found: the offset of its records, the offset its section ends at,
+        its number of records and the offset of its header.
+    """
+    size = len(buffer)
+    headers = [0] if buffer[:1] == b'[' else []
+    for start in range(0, size, SCAN_WINDOW):
+        end = min(start + SCAN_WINDOW, size)
+        # Start one byte early to catch a newline at the end of the previous window.
+        position = buffer.find(b'\n[', max(start - 1, 0), end)
+        while position >= 0:
+            headers.append(position + 1)
+            position = buffer.find(b'\n[', position + 1, end)
+        _release(buffer, start, end)
+
+    wanted = set(headings)
+    sections = {}
+    for header_start, section_end in zip(headers, headers[1:] + [size]):
+        header_end = buffer.find(b'\n', header_start, section_end)
+        header_end = section_end if header_end < 0 else header_end + 1
+        header = section_header(buffer[header_start:header_end].decode(errors='replace'))
+        if header is not None and header[0] in wanted and header[0] not in sections:
+            sections[header[0]] = (header_end, section_end, header[1], header_start)
+    return sections
+
+def line_number(buffer, offset: int) -> int:
+    """
+    The 1-based line number of a byte offset, counted a chunk at a time.
+    """
+    count = 0
+    for start in range(0, offset, SCAN_WINDOW):
+        count += buffer[start:min(start + SCAN_WINDOW, offset)].count(b'\n')
+    return count + 1
+
+@profiling.counted
+def read_sections(filename: str, headings=HEADINGS) -> dict:
+    """
+    Read the UNITS, NODES, .MEMBERS_MAIN_DATA and SHAPES_LIST sections of a RISA-3D file.
+    The file is memory mapped and only the byte ranges of the requested sections are decoded,
+    load cases, results and every other section are never read into Python objects.
+
+    Parameters
+    ----------
+    filename : str
+        The path of the .r3d file.
+    headings : iterable of str, optional
+        The sections to read, by default all HEADINGS. Sections left out come back empty.
+
+    Returns
+    -------
+    dict
+        'units' (dict), 'node_labels' (list), 'node_coords' ((N,3) array), 'members'
+        (dict of lists and arrays, see parse_members and member_dimensions) and 'shapes' (dict).
+
+    Raises
+    ------
+    ParseError
+        If a record is malformed or a section is cut short.
+    """
+    data = {'units': {}, 'node_labels': [], 'node_coords': np.empty((0, 3)), 'shapes': {}}
+    with open(filename, 'rb') as file:
+        # An empty file cannot be mapped and has no sections.
+        buffer = None
+        sections = {}
+        if os.fstat(file.fileno()).st_size > 0:
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            sections = scan_sections(buffer, headings)
+
+        def parse(heading, parser):
+            start, end, num_entries, header_start = sections[heading]
+            records = buffer[start:end].decode(errors='replace').splitlines(keepends=True)[:num_entries]
+            _release(buffer, start, end)
+            # Line numbers are only counted when there is an error to report.
+            if len(records) != num_entries:
+                raise ParseError(f"{heading} expects {num_entries} records, found {len(records)}",
+                                 line_number(buffer, header_start))
+            try:
+                return parser(records, 1)
+            except ParseError as e:
+                raise ParseError(e.message, line_number(buffer, start) + e.line_number - 1) from None
+
+        try:
+            if 'UNITS' in sections:
+                units = parse('UNITS', lambda records, first_line: [record.strip() for record in records])
+                if units:
+                    data['units'] = get_units(units)
+            if 'NODES' in sections:
+                data['node_labels'], data['node_coords'] = parse('NODES', parse_nodes)
+            if 'SHAPES_LIST' in sections:
+                data['shapes'] = parse('SHAPES_LIST', parse_shapes)
+            if '.MEMBERS_MAIN_DATA' in sections:
+                data['members'] = parse('.MEMBERS_MAIN_DATA', parse_members)
+        finally:
+            if buffer is not None:
+                buffer.close()
+    if 'members' not in data:
+        data['members'] = parse_members([], 0)
+    member_dimensions(data['members'], data['shapes'])
+    return data
+
+def parse_file(filename, as_objects: bool = True, headings=HEADINGS):
+    """
+    Parse a RISA-3D file.
+
+    Parameters
+    ----------
+    filename : str
+        The path of the .r3d file.
+    as_objects : bool, optional
+        Return Node and Member instances (default), or the arrays from read_sections.
+    headings : iterable of str, optional
+        The sections to read, see read_sections.
+
+    Returns
+    -------
+    tuple[list[Node], list[Member]] or dict or None
+        The parsed model, or None if the file could not be read.
+    """
     try:
-        with open(filename, 'r') as file:
-            for line in file:
-                for heading in HEADINGS:
-                    if heading in line and "END" not in line:
-                        line = line.strip()
-                        num_entries = int(line.split('<')[-1].strip('>'))
-                        data = []
-                        match heading:
-                            case 'UNITS':
-                                for i in range(num_entries):
-                                    data.append(file.readline().strip())
-                                units = get_units(data)
-                            case 'NODES':
-                                for i in range(num_entries):
-                                    data.append(file.readline().strip())
-                                nodes = get_nodes(data)
-                            case '.MEMBERS_MAIN_DATA':
-                                for i in range(num_entries):
-                                    data.append(file.readline())
-                                members = get_members(data)
-                            case 'SHAPES_LIST':
-                                for i in range(num_entries):
-                                    data.append(file.readline())
-                                shapes = get_shapes_list(data)
+        data = read_sections(filename, headings)
     except FileNotFoundError:
         logging.error("File not found")
         return
     except PermissionError:
         logging.error("Permission denied, could not read file")
         return
+    except ParseError as e:
+        logging.error(f"Could not parse {filename}, {e}")
+        return
     except Exception as e:
-        logging.error("An unknown error occurred")
+        logging.error(f"An unknown error occurred while parsing {filename}: {e!r}")
         return
-    
-    set_member_dimensions(members, shapes)
 
     logging.info("RISA file parsed")
+    if not as_objects:
+        return data
+    return to_objects(data)
+
+@profiling.counted
+def to_objects(data: dict) -> tuple[list[Node], list[Member]]:
+    """
+    Build the Node and Member instances of the arrays returned by read_sections.
+    """
+    nodes = [Node(label, x, y, z) for label, (x, y, z) in zip(data['node_labels'], data['node_coords'].tolist())]
+
+    columns = data['members']
+    members = []
+    rows = zip(columns['label'], columns['design_list'], columns['shape_label'],
+               *(columns[column].tolist() for column in MEMBER_COLUMNS))
+    for label, design_list, shape_label, inode, jnode, knode, rotation, offset, material in rows:
+        members.append(Member(label, design_list, shape_label, ['3D'], inode, jnode, knode, rotation, offset, material))
+    dimensions = zip(*(columns[column].tolist() for column in ('height', 'width', 'thickness', 'radius')))
+    for member, (height, width, thickness, radius) in zip(members, dimensions):
+        member.height, member.width, member.thickness, member.radius = height, width, thickness, radius
     return nodes, members
+
+# The sections a Model is built from, the units are not needed for the geometry.
+MODEL_HEADINGS = ('NODES', '.MEMBERS_MAIN_DATA', 'SHAPES_LIST')
+
+@profiling.counted
+def to_model(data: dict) -> Model:
+    """
+    Build the columnar Model of the arrays returned by read_sections.
+    """
+    columns = data['members']
+    return Model(data['node_coords'], columns['inode'] - 1, columns['jnode'] - 1, columns['rotation'],
+                 columns['width'], columns['height'], columns['radius'], columns['thickness'],
+                 data['node_labels'], columns['label'])
+
+def read_model(filename) -> Union[Model, None]:
+    """
+    Parse a RISA-3D file into a Model.
+
+    Returns
+    -------
+    Model or None
+        The parsed model, or None if the file could not be read.
+    """
+    data = parse_file(filename, as_objects=False, headings=MODEL_HEADINGS)
+    if data is None:
+        return None
+    return to_model(data)
@@ -0,0 +1,137 @@
+"""
+User-defined section views: planes and slabs normal to an axis, e.g. one view per floor or per
+gridline, each exported as its own file next to the standard views.
+
+A section is given as a dict, the form stored in options["Sections"] and in section files:
+    {"name": "level_2", "axis": "z", "at": 240.0, "tolerance": 0.5}   members lying on a plane
+    {"name": "storey_2", "axis": "z", "from": 240.0, "to": 480.0}     members lying in a slab
+    {"axis": "x", "from": 0, "to": 120, "crossing": true}             members crossing a slab
+or as text on the command line: "level_2:z=240~0.5", "z=240..480", "x=0..120+".
+"""
+import json
+import re
+from dataclasses import dataclass
+
+import numpy as np
+
+import geometry as geo
+import spatial
+from model import Model
+
+NUMBER = r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?"
+SECTION_PATTERN = re.compile(rf"^(?:(?P<name>[\w.-]+):)?(?P<axis>[xyzXYZ])=(?P<at>{NUMBER})"
+                             rf"(?:~(?P<tolerance>{NUMBER})|\.\.(?P<to>{NUMBER})(?P<crossing>\+)?)?$")
+NAME_PATTERN = re.compile(r"^[\w.-]+$")
+
+@dataclass
+class Section:
+    """
+    A section view: the members between low and high along an axis.
+
+    Parameters
+    ----------
+    name : str
+        The view name, used in the output file name.
+    axis : int
+        0, 1 or 2 for x, y or z.
+    low, high : float
+        The bounds of the section along the axis, a plane within a tolerance is the slab around it.
+    crossing : bool
+        Also take the members crossing the slab, by default only those lying in it.
+    """
+    name: str
+    axis: int
+    low: float
+    high: float
+    crossing: bool = False
+
+    def members(self, index: spatial.SpatialIndex) -> np.ndarray:
+        """
+        The sorted indices of the members in the section.
+        """
+        return index.slab(self.axis, self.low, self.high, inside=not self.crossing)
+
+def default_name(axis: int, low: float, high: float, plane: bool) -> str:
+    axis_name = spatial.AXES[axis].upper()
+    return f"{axis_name}_{(low + high) / 2:g}" if plane else f"{axis_name}_{low:g}_{high:g}"
+
+def parse_section(spec) -> Section:
+    """
+    Read a section from its dict or text form, see the module docstring.
+
+    Raises
+    ------
+    ValueError
+        If the section is malformed.
+    """
+    if isinstance(spec, str):
+        match = SECTION_PATTERN.match(spec.strip())
+        if match is None:
+            raise ValueError(f"Invalid section '{spec}', expected e.g. z=240, z=240~0.5 or z=0..120")
+        spec = {key: value for key, value in match.groupdict().items() if value is not None}
+        spec["crossing"] = "crossing" in spec
+        if "to" in spec:
+            spec["from"] = spec.pop("at")
+    if not isinstance(spec, dict):
+        raise ValueError(f"Invalid section {spec!r}, expected an object")
+    try:
+        axis = spatial.axis_number(spec.get("axis"))
+        if "at" in spec:
+            tolerance = abs(float(spec.get("tolerance", 0)))
+            low, high, plane = float(spec["at"]) - tolerance, float(spec["at"]) + tolerance, True
+        else:
+            low, high, plane = float(spec["from"]), float(spec["to"]), False
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"Invalid section {spec!r}: {e}") from None
+    if low > high:
+        low, high = high, low
+    name = str(spec.get("name") or default_name(axis, low, high, plane))
+    if not NAME_PATTERN.match(name):
+        raise ValueError(f"Invalid section name '{name}', use letters, digits, '.', '_' and '-'")
+    return Section(name, axis, low, high, bool(spec.get("crossing", False)))
+
+def parse_sections(specs) -> list[Section]:
+    """
+    Read a list of sections, see parse_section. Their names must be unique and differ
+    from the standard views.
+
+    Raises
+    ------
+    ValueError
+        If a section is malformed or its name is taken.
+    """
+    sections = [parse_section(spec) for spec in specs or []]
+    names = set(('3D',) + geo.VIEWS)
+    for section in sections:
+        if section.name in names:
+            raise ValueError(f"Section name '{section.name}' is used twice or by a standard view")
+        names.add(section.name)
+    return sections
+
+def load_sections(path: str) -> list[dict]:
+    """
+    Read the sections of a JSON file holding a list of section dicts.
+
+    Raises
+    ------
+    ValueError
+        If the file is not valid JSON or not a list of sections.
+    """
+    with open(path, 'r') as section_file:
+        specs = json.load(section_file)
+    if not isinstance(specs, list):
+        raise ValueError(f"{path} must hold a list of sections")
+    parse_sections(specs)
+    return specs
+
+def section_masks(model: Model, sections: list[Section]) -> dict[str, np.ndarray]:
+    """
+    The members of every section, queried on the model's spatial index.
+
+    Returns
+    -------
+    dict[str, np.ndarray]
+        A boolean mask over the members per section name.
+    """
+    index = model.spatial_index()
+    return {section.name: index.mask(section.members(index)) for section in sections}
@@ -0,0 +1,378 @@
+"""
+Conversion daemon: accepts conversion jobs over localhost HTTP or a Unix socket and runs them in
+a pool of worker processes that live as long as the server, so NumPy, the parsers and the cylinder
+tables are loaded once instead of for every file.
+
+Usage (from the src directory):
+    python -m server --port 8765 -j 4
+    python -m server --socket /tmp/converter.sock
+
+    curl -X POST localhost:8765/jobs -d '{"path": "/models/tower.r3d", "options": {"Dest": "/exports"}}'
+    curl -N localhost:8765/jobs/1/events
+    curl --unix-socket /tmp/converter.sock http://localhost/jobs
+
+Endpoints:
+    POST /jobs              Queue a job, {"path": ..., "options": {...}} with options shaped like the GUI's.
+    GET  /jobs              The status of every job.
+    GET  /jobs/<id>         The status of one job.
+    GET  /jobs/<id>/events  One JSON line per status change of a job, streamed until it finishes.
+    GET  /health            The number of workers and of queued and running jobs.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+
+import exporters as exp
+import geometry as geo
+import pipeline
+import sections as sec
+
+# Options a job does not set, the defaults of the GUI.
+DEFAULT_OPTIONS = {"Dim": "All", "YZ": True, "XZ": True, "XY": True, "Cyl": 16, "Prec": 3, "Subs": True,
+                   "Format": "obj", "Weld": False}
+# Finished jobs kept for status queries, the oldest are forgotten first.
+MAX_JOBS = 1000
+MAX_BODY = 1 << 20
+FINISHED = ("done", "failed")
+REASONS = {200: "OK", 202: "Accepted", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large"}
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+@dataclass
+class Job:
+    """
+    A conversion job and its status: queued, running, done or failed.
+    """
+    id: int
+    path: str
+    options: dict
+    status: str = "queued"
+    submitted: float = field(default_factory=time.time)
+    started: float = None
+    finished: float = None
+    error: str = None
+    # Queues of the clients streaming this job's status changes.
+    watchers: list = field(default_factory=list, repr=False)
+
+    def to_dict(self) -> dict:
+        record = {"id": self.id, "path": self.path, "status": self.status, "submitted": self.submitted,
+                  "started": self.started, "finished": self.finished}
+        if self.started is not None and self.finished is not None:
+            record["seconds"] = self.finished - self.started
+        if self.error is not None:
+            record["error"] = self.error
+        return record
+
+def _init_worker(log_file: str, level: int) -> None:
+    pipeline.setup_logging(log_file, level)
+    geo.circ_faces(DEFAULT_OPTIONS["Cyl"])
+
+def _warm_up() -> int:
+    return os.getpid()
+
+class Server:
+    """
+    The job queue and its pool of conversion processes. At most one job per worker runs at a time,
+    the others wait in submission order. When a worker dies, e.g. killed for running out of memory,
+    the pool is replaced and the jobs it broke are run once more.
+
+    Parameters
+    ----------
+    workers : int, optional
+        Number of worker processes, by default one per CPU.
+    log_file : str, optional
+        The log file of the workers, by default they log to the console.
+    level : int, optional
+        The logging level of the workers.
+    """
+    def __init__(self, workers: int = None, log_file: str = None, level: int = logging.INFO) -> None:
+        self.workers = workers or os.cpu_count() or 1
+        self.log_file = log_file
+        self.level = level
+        self.pool = self._new_pool()
+        self.slots = asyncio.Semaphore(self.workers)
+        self.jobs = OrderedDict()
+        self.ids = itertools.count(1)
+        self.tasks = set()
+
+    async def start(self) -> None:
+        """
+        Start the worker processes ahead of the first job.
+        """
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self.pool, _warm_up) for _ in range(self.workers)))
+
+    def close(self) -> None:
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker, initargs=(self.log_file, self.level))
+
+    async def _restart(self, broken: ProcessPoolExecutor) -> None:
+        # Every job running on a broken pool fails with it, only the first one replaces it.
+        if self.pool is not broken:
+            return
+        logging.error("A worker process died, restarting the pool")
+        broken.shutdown(wait=False, cancel_futures=True)
+        self.pool = self._new_pool()
+        await self.start()
+
+    async def _convert(self, job: Job) -> bool:
+        loop = asyncio.get_running_loop()
+        for attempt in range(2):
+            pool = self.pool
+            try:
+                return await loop.run_in_executor(pool, pipeline.convert_file, job.path, job.options)
+            except BrokenProcessPool:
+                await self._restart(pool)
+                if attempt:
+                    raise
+                logging.info(f"Job {job.id} was interrupted by a dead worker, running it again")
+
+    def submit(self, path: str, options: dict) -> Job:
+        """
+        Queue the conversion of a file, options not given take the GUI's defaults.
+        """
+        job = Job(next(self.ids), path, {**DEFAULT_OPTIONS, **options})
+        self.jobs[job.id] = job
+        self._forget()
+        task = asyncio.get_running_loop().create_task(self._run(job))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        logging.info(f"Job {job.id} queued: {path}")
+        return job
+
+    def _forget(self) -> None:
+        while len(self.jobs) > MAX_JOBS:
+            oldest = next((id for id, job in self.jobs.items() if job.status in FINISHED), None)
+            if oldest is None:
+                return
+            del self.jobs[oldest]
+
+    def _update(self, job: Job, status: str, **fields) -> None:
+        job.status = status
+        for name, value in fields.items():
+            setattr(job, name, value)
+        state = job.to_dict()
+        for queue in job.watchers:
+            queue.put_nowait(state)
+
+    async def _run(self, job: Job) -> None:
+        async with self.slots:
+            self._update(job, "running", started=time.time())
+            try:
+                converted = await self._convert(job)
+            except Exception as e:
+                logging.error(f"Job {job.id} failed: {e}")
+                self._update(job, "failed", finished=time.time(), error=str(e) or type(e).__name__)
+                return
+        error = None if converted else "The file could not be converted, see the log."
+        self._update(job, "done" if converted else "failed", finished=time.time(), error=error)
+        logging.info(f"Job {job.id} {job.status} in {job.finished - job.started:.3f}s")
+
+    def health(self) -> dict:
+        statuses = [job.status for job in self.jobs.values()]
+        return {"status": "ok", "workers": self.workers,
+                "queued": statuses.count("queued"), "running": statuses.count("running")}
+
+    def new_job(self, body: bytes) -> Job:
+        """
+        Validate a POST /jobs body and queue its job.
+        """
+        try:
+            request = json.loads(body or b"{}")
+        except ValueError as e:
+            raise HttpError(400, f"Invalid JSON: {e}")
+        if not isinstance(request, dict) or not isinstance(request.get("path"), str):
+            raise HttpError(400, 'Expected {"path": "<file>", "options": {...}}')
+        options = request.get("options", {})
+        if not isinstance(options, dict):
+            raise HttpError(400, "options must be an object")
+        if options.get("Format", DEFAULT_OPTIONS["Format"]) not in exp.EXPORTERS:
+            raise HttpError(400, f"Format must be one of {', '.join(sorted(exp.EXPORTERS))}")
+        try:
+            sec.parse_sections(options.get("Sections"))
+        except ValueError as e:
+            raise HttpError(400, str(e))
+        path = os.path.abspath(request["path"])
+        # Outputs go next to the input unless a destination is given, which is created like the CLI does.
+        options = {"Dest": os.path.dirname(path), **options}
+        try:
+            os.makedirs(options["Dest"], exist_ok=True)
+        except (OSError, TypeError) as e:
+            raise HttpError(400, f"Invalid destination {options['Dest']}: {e}")
+        return self.submit(path, options)
+
+    def find(self, job_id: str) -> Job:
+        job = self.jobs.get(int(job_id)) if job_id.isdigit() else None
+        if job is None:
+            raise HttpError(404, f"No job {job_id}")
+        return job
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        Serve one HTTP request per connection.
+        """
+        try:
+            try:
+                method, target, body = await read_request(reader)
+                await self.respond(method, target, body, writer)
+            except HttpError as e:
+                writer.write(response(e.status, {"error": e.message}))
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, method: str, target: str, body: bytes, writer: asyncio.StreamWriter) -> None:
+        parts = [part for part in target.split("?")[0].split("/") if part]
+        if parts == ["health"]:
+            allow(method, "GET")
+            writer.write(response(200, self.health()))
+        elif parts == ["jobs"]:
+            allow(method, "GET", "POST")
+            if method == "POST":
+                writer.write(response(202, self.new_job(body).to_dict()))
+            else:
+                writer.write(response(200, [job.to_dict() for job in self.jobs.values()]))
+        elif len(parts) == 2 and parts[0] == "jobs":
+            allow(method, "GET")
+            writer.write(response(200, self.find(parts[1]).to_dict()))
+        elif len(parts) == 3 and parts[0] == "jobs" and parts[2] == "events":
+            allow(method, "GET")
+            await self.stream(self.find(parts[1]), writer)
+        else:
+            raise HttpError(404, f"No endpoint {target}")
+
+    async def stream(self, job: Job, writer: asyncio.StreamWriter) -> None:
+        """
+        Send the job's status, then every change of it, as chunked JSON lines until it finishes.
+        """
+        queue = asyncio.Queue()
+        job.watchers.append(queue)
+        try:
+            writer.write(head(200, "application/x-ndjson", {"Transfer-Encoding": "chunked"}))
+            state = job.to_dict()
+            while True:
+                line = (json.dumps(state) + "\n").encode()
+                writer.write(b"%x\r\n%s\r\n" % (len(line), line))
+                await writer.drain()
+                if state["status"] in FINISHED:
+                    break
+                state = await queue.get()
+            writer.write(b"0\r\n\r\n")
+        finally:
+            job.watchers.remove(queue)
+
+def allow(method: str, *methods: str) -> None:
+    if method not in methods:
+        raise HttpError(405, f"Use {' or '.join(methods)}")
+
+async def read_request(reader: asyncio.StreamReader) -> tuple[str, str, bytes]:
+    """
+    Read the request line, headers and body of an HTTP request.
+
+    Returns
+    -------
+    tuple[str, str, bytes]
+        The method, the target and the body.
+    """
+    request_line = (await reader.readline()).decode("latin-1").split()
+    if len(request_line) != 3:
+        raise HttpError(400, "Malformed request line")
+    headers = {}
+    while True:
+        line = (await reader.readline()).decode("latin-1").strip()
+        if not line:
+            break
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get("content-length", 0) or 0)
+    except ValueError:
+        raise HttpError(400, "Invalid Content-Length") from None
+    if length < 0:
+        raise HttpError(400, "Invalid Content-Length")
+    if length > MAX_BODY:
+        raise HttpError(413, f"Request bodies are limited to {MAX_BODY} bytes")
+    body = await reader.readexactly(length) if length else b""
+    return request_line[0].upper(), request_line[1], body
+
+def head(status: int, content_type: str, headers: dict = None) -> bytes:
+    lines = [f"HTTP/1.1 {status} {REASONS.get(status, '')}", f"Content-Type: {content_type}", "Connection: close"]
+    lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+def response(status: int, payload) -> bytes:
+    body = (json.dumps(payload) + "\n").encode()
+    return head(status, "application/json", {"Content-Length": len(body)}) + body
+
+async def serve(host: str = "127.0.0.1", port: int = 8765, socket_path: str = None, workers: int = None,
+                log_file: str = None, level: int = logging.INFO) -> None:
+    """
+    Run the conversion server until it is cancelled.
+
+    Parameters
+    ----------
+    host, port : str, int
+        The address listened on when no socket_path is given.
+    socket_path : str, optional
+        Listen on this Unix socket instead of TCP.
+    workers : int, optional
+        Number of worker processes, by default one per CPU.
+    log_file : str, optional
+        The log file of the workers.
+    level : int, optional
+        The logging level of the workers.
+    """
+    server = Server(workers, log_file, level)
+    try:
+        await server.start()
+        if socket_path:
+            listener = await asyncio.start_unix_server(server.handle, path=socket_path)
+            address = socket_path
+        else:
+            listener = await asyncio.start_server(server.handle, host, port)
+            address = f"http://{host}:{port}"
+        logging.info(f"Conversion server listening on {address} with {server.workers} worker processes")
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        server.close()
+        if socket_path and os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(prog="server", description="Run a conversion server for RISA-3D and Modelsmart files.")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on. Default is 127.0.0.1.")
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on. Default is 8765.")
+    parser.add_argument("--socket", default=None, help="Listen on this Unix socket instead of TCP.")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="Number of worker processes. Default is one per CPU.")
+    parser.add_argument("--log-file", default=None, help="Write the log to this file instead of the console.")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Log debug messages.")
+    args = parser.parse_args(argv)
+    level = logging.DEBUG if args.verbose else logging.INFO
+    pipeline.setup_logging(args.log_file, level)
+    try:
+        asyncio.run(serve(args.host, args.port, args.socket, args.workers, args.log_file, level))
+    except KeyboardInterrupt:
+        logging.info("Conversion server stopped")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
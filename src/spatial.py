@@ -0,0 +1,186 @@
+"""
+Spatial index over the members of a model for plane, slab and box queries.
+"""
+import numpy as np
+
+import profiling
+
+AXES = "xyz"
+# Largest number of cells along one axis, bounds the memory of the cell table.
+MAX_CELLS = 256
+
+def axis_number(axis) -> int:
+    """
+    The index of an axis given as 0, 1, 2 or 'x', 'y', 'z'.
+    """
+    if isinstance(axis, str):
+        if axis.lower() not in AXES:
+            raise ValueError(f"Unknown axis {axis}, expected one of x, y, z")
+        return AXES.index(axis.lower())
+    if axis not in (0, 1, 2):
+        raise ValueError(f"Unknown axis {axis}, expected 0, 1 or 2")
+    return int(axis)
+
+class SpatialIndex:
+    """
+    Sub-linear queries over the axis-aligned bounding boxes of the member segments.
+
+    Plane and slab queries binary search the members sorted by the low end of their box
+    along the query axis. Box queries use a uniform grid in which every member is listed
+    in each cell its box overlaps, so only the members of the cells overlapping the box
+    are tested. The grid cells hold about one member each and are never smaller than the
+    median member box, so most members are listed in only a few cells.
+    Each structure is built on first use and kept.
+
+    Parameters
+    ----------
+    i_coords, j_coords : np.ndarray
+        (N,3) coordinates of the i and j nodes.
+    """
+    def __init__(self, i_coords: np.ndarray, j_coords: np.ndarray) -> None:
+        self.low = np.minimum(i_coords, j_coords)
+        self.high = np.maximum(i_coords, j_coords)
+        self._orders = {}
+        self.members = None
+
+    def __len__(self) -> int:
+        return self.low.shape[0]
+
+    def order(self, axis: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        The members sorted by the low end of their box along an axis, and those low ends.
+        """
+        if axis not in self._orders:
+            order = np.argsort(self.low[:, axis])
+            self._orders[axis] = (order, self.low[order, axis])
+        return self._orders[axis]
+
+    @profiling.counted
+    def build_grid(self) -> None:
+        """
+        Build the uniform grid of the box queries.
+        """
+        count = self.low.shape[0]
+        self.origin = self.low.min(axis=0) if count else np.zeros(3)
+        extent = self.high.max(axis=0) - self.origin if count else np.zeros(3)
+
+        spanned = extent[extent > 0]
+        cell = (np.prod(spanned) / max(count, 1)) ** (1 / len(spanned)) if len(spanned) else 1.0
+        if count:
+            cell = max(cell, float(np.median((self.high - self.low).max(axis=1))))
+        cell = max(cell, float(extent.max()) / MAX_CELLS, np.finfo(float).tiny)
+        self.cell_size = cell
+        self.shape = np.minimum(np.floor(extent / cell).astype(np.int64) + 1, MAX_CELLS)
+
+        first, last = self.cells(self.low), self.cells(self.high)
+        spans = last - first + 1
+        counts = spans.prod(axis=1)
+        # Every (member, cell) pair: the k-th cell of a member's box, unravelled x fastest.
+        members = np.repeat(np.arange(count), counts)
+        k = np.arange(int(counts.sum())) - np.repeat(np.cumsum(counts) - counts, counts)
+        span = spans[members]
+        x = first[members, 0] + k % span[:, 0]
+        y = first[members, 1] + k // span[:, 0] % span[:, 1]
+        z = first[members, 2] + k // (span[:, 0] * span[:, 1])
+        cell_ids = (z * self.shape[1] + y) * self.shape[0] + x
+        # Cell c lists members[starts[c]:starts[c + 1]], in member order.
+        self.members = members[np.argsort(cell_ids, kind='stable')]
+        self.starts = np.concatenate(([0], np.cumsum(np.bincount(cell_ids, minlength=int(self.shape.prod())))))
+
+    def cells(self, points: np.ndarray) -> np.ndarray:
+        """
+        The (x, y, z) cell of each point, points outside the grid go to its border cells.
+        """
+        with np.errstate(invalid='ignore', over='ignore'):
+            cells = np.floor((np.asarray(points, dtype=float) - self.origin) / self.cell_size)
+        return np.clip(np.nan_to_num(cells, nan=0, posinf=MAX_CELLS, neginf=-1), 0, self.shape - 1).astype(np.int64)
+
+    def candidates(self, low: np.ndarray, high: np.ndarray) -> np.ndarray:
+        """
+        The members listed in the cells overlapping a box, without duplicates.
+        """
+        first, last = self.cells(low), self.cells(high)
+        x, y, z = (np.arange(first[axis], last[axis] + 1) for axis in range(3))
+        cell_ids = ((z[:, None, None] * self.shape[1] + y[None, :, None]) * self.shape[0] + x[None, None, :]).ravel()
+        starts, ends = self.starts[cell_ids], self.starts[cell_ids + 1]
+        lengths = ends - starts
+        entries = np.arange(int(lengths.sum())) + np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+        return np.unique(self.members[entries])
+
+    @profiling.counted
+    def box(self, low, high, inside: bool = False) -> np.ndarray:
+        """
+        The members in an axis-aligned box.
+
+        Parameters
+        ----------
+        low, high : array_like
+            (3,) corners of the box, use -np.inf and np.inf for an unbounded axis.
+        inside : bool, optional
+            Only the members lying entirely in the box, by default every member whose box
+            overlaps it.
+
+        Returns
+        -------
+        np.ndarray
+            The sorted indices of the members.
+        """
+        low = np.asarray(low, dtype=float)
+        high = np.asarray(high, dtype=float)
+        if len(self) == 0 or np.any(low > high):
+            return np.empty(0, dtype=np.int64)
+        if self.members is None:
+            self.build_grid()
+        found = self.candidates(low, high)
+        if inside:
+            keep = np.all((self.low[found] >= low) & (self.high[found] <= high), axis=1)
+        else:
+            keep = np.all((self.high[found] >= low) & (self.low[found] <= high), axis=1)
+        return found[keep]
+
+    @profiling.counted
+    def slab(self, axis, low: float, high: float, inside: bool = True) -> np.ndarray:
+        """
+        The members between two planes normal to an axis, e.g. everything between two levels.
+
+        Parameters
+        ----------
+        axis : int or str
+            The axis normal to the planes, see axis_number.
+        low, high : float
+            The coordinates of the planes along the axis.
+        inside : bool, optional
+            Only the members lying entirely in the slab, the default, or every member
+            crossing it, see box.
+
+        Returns
+        -------
+        np.ndarray
+            The sorted indices of the members.
+        """
+        axis = axis_number(axis)
+        if not inside:
+            box_low, box_high = np.full(3, -np.inf), np.full(3, np.inf)
+            box_low[axis], box_high[axis] = low, high
+            return self.box(box_low, box_high)
+        if len(self) == 0 or low > high:
+            return np.empty(0, dtype=np.int64)
+        # A member lying in the slab starts in it, the candidates are one range of the sorted order.
+        order, starts = self.order(axis)
+        found = order[np.searchsorted(starts, low, side='left'):np.searchsorted(starts, high, side='right')]
+        return np.sort(found[self.high[found, axis] <= high])
+
+    def plane(self, axis, coordinate: float, tolerance: float = 0.0) -> np.ndarray:
+        """
+        The members lying on a plane normal to an axis, both ends within tolerance of it.
+        A zero tolerance is the exact comparison of Member.set_views.
+        """
+        return self.slab(axis, coordinate - tolerance, coordinate + tolerance, inside=True)
+
+    def mask(self, members: np.ndarray) -> np.ndarray:
+        """
+        Turn the indices returned by a query into a boolean mask over the members.
+        """
+        mask = np.zeros(len(self), dtype=bool)
+        mask[members] = True
+        return mask
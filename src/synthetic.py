@@ -0,0 +1,155 @@
+"""
+Generators of synthetic RISA-3D (.r3d) and Modelsmart (.3dd) models for benchmarking.
+The files only contain the sections and blocks the parsers read.
+
+Usage (from the src directory):
+    python -m synthetic tower 40 -o tower40
+"""
+import argparse
+import math
+import random
+from dataclasses import dataclass, field
+
+# Rectangular sections as (name, height, thickness, width) and round ones as (name, diameter, thickness).
+RECT_SHAPES = [("HSS4X6X4", 6.0, 0.25, 4.0), ("HSS8X8X2", 8.0, 0.5, 8.0), ("W8X10X1", 8.0, 0.17, 4.0)]
+PIPE_SHAPES = [("PIPE4.5X0.237", 4.5, 0.237), ("PIPE2.4X0.154", 2.375, 0.154), ("PIPE12.75X0.375", 12.75, 0.375)]
+
+@dataclass
+class SyntheticModel:
+    """
+    A generated model: node coordinates and members as (i node, j node, rotation, shape name),
+    node numbers being 1-based.
+    """
+    nodes: list = field(default_factory=list)
+    members: list = field(default_factory=list)
+
+    def add_node(self, x: float, y: float, z: float) -> int:
+        self.nodes.append((x, y, z))
+        return len(self.nodes)
+
+    def add_member(self, inode: int, jnode: int, shape: str, rotation: float = 0) -> None:
+        self.members.append((inode, jnode, rotation, shape))
+
+def grid(nx: int, ny: int = None, nz: int = None, pipe_ratio: float = 0.3, seed: int = 0) -> SyntheticModel:
+    """
+    A rectangular space frame of nx*ny*nz nodes, members along the three axes,
+    a pipe_ratio share of them round.
+    """
+    ny = nx if ny is None else ny
+    nz = nx if nz is None else nz
+    rnd = random.Random(seed)
+    model = SyntheticModel()
+    index = {}
+    for k in range(nz):
+        for j in range(ny):
+            for i in range(nx):
+                index[i, j, k] = model.add_node(i * 10.0, j * 12.5, k * 3.25)
+    for (i, j, k), node in index.items():
+        for di, dj, dk in ((1, 0, 0), (0, 1, 0), (0, 0, 1)):
+            other = index.get((i + di, j + dj, k + dk))
+            if other is not None:
+                shape = rnd.choice(PIPE_SHAPES)[0] if rnd.random() < pipe_ratio else rnd.choice(RECT_SHAPES)[0]
+                model.add_member(node, other, shape, rnd.choice((0, 0, 90, 30)))
+    return model
+
+def tower(levels: int, sides: int = 4, width: float = 240.0, taper: float = 0.985, height: float = 120.0) -> SyntheticModel:
+    """
+    A tapering lattice tower: pipe legs, rectangular horizontals and X bracing on every face.
+    """
+    model = SyntheticModel()
+    rings = []
+    for level in range(levels + 1):
+        radius = width / 2 * taper ** level
+        # Half a side of offset puts a face of a square tower on each of the x and y extremes.
+        rings.append([model.add_node(radius * math.cos(2 * math.pi * (side + 0.5) / sides),
+                                     radius * math.sin(2 * math.pi * (side + 0.5) / sides),
+                                     level * height) for side in range(sides)])
+    for level in range(levels):
+        lower, upper = rings[level], rings[level + 1]
+        for side in range(sides):
+            following = (side + 1) % sides
+            model.add_member(lower[side], upper[side], PIPE_SHAPES[2][0])
+            model.add_member(upper[side], upper[following], RECT_SHAPES[0][0], 90)
+            model.add_member(lower[side], upper[following], PIPE_SHAPES[1][0])
+            model.add_member(lower[following], upper[side], PIPE_SHAPES[1][0])
+    for side in range(sides):
+        model.add_member(rings[0][side], rings[0][(side + 1) % sides], RECT_SHAPES[0][0], 90)
+    return model
+
+def truss(panels: int, trusses: int = 10, panel: float = 60.0, depth: float = 72.0, spacing: float = 240.0) -> SyntheticModel:
+    """
+    A row of Pratt trusses tied by purlins: rectangular chords, pipe verticals and diagonals.
+    """
+    model = SyntheticModel()
+    previous = None
+    for t in range(trusses):
+        y = t * spacing
+        bottom = [model.add_node(p * panel, y, 0.0) for p in range(panels + 1)]
+        top = [model.add_node(p * panel, y, depth) for p in range(panels + 1)]
+        for p in range(panels):
+            model.add_member(bottom[p], bottom[p + 1], RECT_SHAPES[1][0])
+            model.add_member(top[p], top[p + 1], RECT_SHAPES[1][0])
+            # Pratt diagonals slope down towards mid-span.
+            if p < panels // 2:
+                model.add_member(top[p], bottom[p + 1], PIPE_SHAPES[0][0])
+            else:
+                model.add_member(bottom[p], top[p + 1], PIPE_SHAPES[0][0])
+        for p in range(panels + 1):
+            model.add_member(bottom[p], top[p], PIPE_SHAPES[0][0])
+        if previous is not None:
+            for p in range(panels + 1):
+                model.add_member(previous[p], top[p], RECT_SHAPES[2][0], 90)
+        previous = top
+    return model
+
+GENERATORS = {"grid": grid, "tower": tower, "truss": truss}
+
+def write_r3d(path: str, model: SyntheticModel) -> None:
+    """
+    Write a model as a RISA-3D file with UNITS, NODES, .MEMBERS_MAIN_DATA and SHAPES_LIST sections.
+    """
+    lines = ['[UNITS] <1>', '"units" 0 0 0;', '[END_UNITS]', f'[NODES] <{len(model.nodes)}>']
+    lines.extend(f'"N{n}" {x!r} {y!r} {z!r} 0 0 ;' for n, (x, y, z) in enumerate(model.nodes, 1))
+    lines.extend(['[END_NODES]', f'[.MEMBERS_MAIN_DATA] <{len(model.members)}>'])
+    lines.extend(f'"M{m}" "DL" "{shape}" {i} {j} 0 {rotation} 0 0 0 1 0;'
+                 for m, (i, j, rotation, shape) in enumerate(model.members, 1))
+    lines.extend(['[END_.MEMBERS_MAIN_DATA]', f'[SHAPES_LIST] <{len(RECT_SHAPES) + len(PIPE_SHAPES)}>'])
+    lines.extend(f'"{name}" 0 0 0 0 {height} {thickness} {width} 0;' for name, height, thickness, width in RECT_SHAPES)
+    lines.extend(f'"{name}" 0 0 0 0 {diameter} {thickness} 0 0;' for name, diameter, thickness in PIPE_SHAPES)
+    lines.append('[END_SHAPES_LIST]')
+    with open(path, 'w') as file:
+        file.write('\n'.join(lines) + '\n')
+
+def write_3dd(path: str, model: SyntheticModel) -> None:
+    """
+    Write a model as a Modelsmart file. Modelsmart members have no round sections,
+    so pipes are written with a square section of their diameter.
+    """
+    shapes = [(name, height, width) for name, height, _, width in RECT_SHAPES]
+    shapes += [(name, diameter, diameter) for name, diameter, _ in PIPE_SHAPES]
+    shape_numbers = {name: number for number, (name, _, _) in enumerate(shapes, 1)}
+    lines = ['MODELSMART', '4', f'{len(shapes)} 1 {len(model.nodes)} {len(model.members)} 0']
+    lines.extend(f'{n} {x!r} {y!r} {z!r} 0 0 0 0 0 0 0 0' for n, (x, y, z) in enumerate(model.nodes, 1))
+    lines.extend(f'{m} {i} {j} 0.0 0.0 0 0 0.0 0.0 {shape_numbers[shape]} 1 0 {rotation} 0 0 0 0 0 0.5 0.5 0.5'
+                 for m, (i, j, rotation, shape) in enumerate(model.members, 1))
+    lines.extend('0 0 0 0 0 0' for _ in model.nodes)
+    for number, (name, height, width) in enumerate(shapes, 1):
+        lines.extend([str(number), name, f'0 0 {height} {width} 1.0', '1 2 3 4 5 6'])
+    with open(path, 'w') as file:
+        file.write('\n'.join(lines) + '\n')
+
+WRITERS = {".r3d": write_r3d, ".3dd": write_3dd}
+
+def main(argv: list[str] = None) -> None:
+    parser = argparse.ArgumentParser(prog="synthetic", description="Generate synthetic .r3d and .3dd models.")
+    parser.add_argument("kind", choices=sorted(GENERATORS), help="Model topology.")
+    parser.add_argument("size", type=int, help="Nodes per side of a grid, levels of a tower or panels of a truss.")
+    parser.add_argument("-o", "--output", default="synthetic", help="Output path without extension.")
+    args = parser.parse_args(argv)
+    model = GENERATORS[args.kind](args.size)
+    for extension, writer in WRITERS.items():
+        writer(args.output + extension, model)
+        print(f"{args.output}{extension}: {len(model.nodes)} nodes, {len(model.members)} members")
+
+if __name__ == "__main__":
+    main()
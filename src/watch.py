@@ -0,0 +1,201 @@
+"""
+Watch mode: poll folders for new or modified .r3d and .3dd files and convert each once it has
+stopped changing. Polling compares the modification time and size of every file, so it also
+works on network shares where file system events are not delivered.
+"""
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pipeline
+
+EXTENSIONS = (".r3d", ".3dd")
+INDEX_NAME = ".watch_index.json"
+# Seconds between two scans, and seconds a file must stay unchanged before it is converted.
+INTERVAL = 2.0
+SETTLE = 2.0
+
+def scan(paths: list[str]) -> dict[str, tuple[int, int]]:
+    """
+    Find the model files under the watched paths.
+
+    Parameters
+    ----------
+    paths : list[str]
+        Folders, searched recursively, or single files.
+
+    Returns
+    -------
+    dict[str, tuple[int, int]]
+        The modification time in nanoseconds and size of every file, by absolute path.
+    """
+    files = {}
+    for path in paths:
+        if os.path.isfile(path):
+            candidates = [path]
+        else:
+            candidates = (os.path.join(folder, name) for folder, _, names in os.walk(path) for name in names)
+        for candidate in candidates:
+            if os.path.splitext(candidate)[1].lower() not in EXTENSIONS:
+                continue
+            try:
+                stat = os.stat(candidate)
+            except OSError:
+                # Deleted or renamed between the listing and the stat.
+                continue
+            files[os.path.abspath(candidate)] = (stat.st_mtime_ns, stat.st_size)
+    return files
+
+class Watcher:
+    """
+    Converts the model files under a set of paths whenever they change.
+
+    A file is converted once the same modification time and size have been seen for settle
+    seconds over at least two scans, so files still being copied or saved are left alone.
+    The signature of every converted file is kept in an index in the destination folder,
+    so after a restart only the files changed in the meantime are converted again.
+
+    Parameters
+    ----------
+    paths : list[str]
+        The watched folders or files.
+    options : dict
+        The conversion options, see pipeline.convert_file.
+    workers : int, optional
+        Most files converted at the same time, by default one per CPU.
+    interval : float, optional
+        Seconds between scans.
+    settle : float, optional
+        Seconds a file must stay unchanged before it is converted.
+    """
+    def __init__(self, paths: list[str], options, workers: int = None, interval: float = INTERVAL,
+                 settle: float = SETTLE) -> None:
+        self.paths = paths
+        self.options = options
+        self.workers = max(workers or os.cpu_count() or 1, 1)
+        self.interval = interval
+        self.settle = settle
+        self.index_path = os.path.join(options["Dest"], INDEX_NAME)
+        self.index = self.load_index()
+        # Changed files waiting to settle: path -> (signature, time first seen with it).
+        self.pending = {}
+        # Files being converted: path -> (future, signature).
+        self.running = {}
+        self.pool = None
+
+    def load_index(self) -> dict[str, tuple[int, int]]:
+        try:
+            with open(self.index_path, 'r') as index_file:
+                return {path: tuple(signature) for path, signature in json.load(index_file).items()}
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError, TypeError, AttributeError) as e:
+            logging.error(f"Ignoring unreadable watch index {self.index_path}: {e}")
+            return {}
+
+    def save_index(self) -> None:
+        try:
+            with open(self.index_path + ".tmp", 'w') as index_file:
+                json.dump(self.index, index_file, indent=1, sort_keys=True)
+            os.replace(self.index_path + ".tmp", self.index_path)
+        except OSError as e:
+            logging.error(f"Could not store the watch index {self.index_path}: {e}")
+
+    def ready(self, files: dict[str, tuple[int, int]], now: float) -> list[str]:
+        """
+        Update the pending files from a scan and list those that have settled.
+
+        Parameters
+        ----------
+        files : dict[str, tuple[int, int]]
+            The result of scan.
+        now : float
+            The time of the scan.
+
+        Returns
+        -------
+        list[str]
+            The paths to convert, oldest change first.
+        """
+        for path in list(self.pending):
+            if path not in files:
+                del self.pending[path]
+        settled = []
+        for path, signature in files.items():
+            # A file changed during its conversion waits for the conversion to finish.
+            if self.index.get(path) == signature or path in self.running:
+                continue
+            seen = self.pending.get(path)
+            if seen is None or seen[0] != signature:
+                self.pending[path] = (signature, now)
+            elif now - seen[1] >= self.settle:
+                settled.append(path)
+        return sorted(settled, key=lambda path: self.pending[path][1])
+
+    def collect(self, stopping: bool = False) -> None:
+        """
+        Record the conversions that finished. A failed file is not retried until it changes again,
+        except a conversion interrupted by stopping the watch, which is retried on the next start.
+        """
+        finished = [path for path, (future, _) in self.running.items() if future.done()]
+        for path in finished:
+            future, signature = self.running.pop(path)
+            try:
+                converted = future.result()
+            except Exception as e:
+                logging.error(f"Conversion of {path} failed: {e}")
+                if stopping:
+                    continue
+                converted = False
+            if converted:
+                logging.info(f"Converted {path}")
+            else:
+                logging.error(f"Failed to convert {path}, waiting for it to change")
+            self.index[path] = signature
+        if finished:
+            self.save_index()
+
+    def step(self, now: float = None) -> None:
+        """
+        Scan once, then start the settled files while fewer than workers are converting.
+        """
+        now = time.monotonic() if now is None else now
+        self.collect()
+        for path in self.ready(scan(self.paths), now):
+            if len(self.running) >= self.workers:
+                break
+            signature, seen = self.pending.pop(path)
+            logging.info(f"Change detected, converting {path}")
+            try:
+                future = self.pool.submit(pipeline.convert_file, path, self.options)
+            except BrokenProcessPool:
+                # A worker died, the file is converted on the next scan by a new pool.
+                logging.error("A worker process died, restarting the pool")
+                self.pending[path] = (signature, seen)
+                self.pool.shutdown(wait=False, cancel_futures=True)
+                self.pool = self.new_pool()
+                break
+            self.running[path] = (future, signature)
+
+    def new_pool(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=pipeline.setup_logging,
+                                   initargs=(pipeline.current_log_file(), logging.getLogger().level))
+
+    def run(self) -> None:
+        """
+        Watch until interrupted, then wait for the running conversions.
+        """
+        logging.info(f"Watching {', '.join(self.paths)} every {self.interval}s with {self.workers} worker(s)")
+        self.pool = self.new_pool()
+        try:
+            while True:
+                self.step()
+                time.sleep(self.interval)
+        except KeyboardInterrupt:
+            logging.info("Stopping the watch, waiting for running conversions")
+        finally:
+            self.pool.shutdown(wait=True, cancel_futures=True)
+            self.collect(stopping=True)